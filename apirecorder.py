@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+apirecorder.py — Spela in och spela upp API-trafik (requests) som fixtures.
+
+Inspelning (SUNO_RECORD=fil.jsonl): varje request/svar-par från create_songs.py,
+poll_songs.py och suno_daemon.py sparas som en JSON-rad med tidsoffset och svarstid
+(elapsed = tid till svarshuvud, body_sec = tid för att läsa en strömmad kropp).
+Strömmade svar (stream=True, t.ex. MP3) läses fortfarande i bitar av anroparen; raden
+skrivs när kroppen är läst eller svaret stängs (incomplete=true om det avbröts).
+API-nyckeln skrubbas (Authorization-header och nyckeln var den än förekommer).
+Binära svar (MP3) sparas base64 upp till SUNO_RECORD_MAX_BYTES, större sparas som
+storlek + sha256 och spelas upp som nollbytes med samma längd.
+
+Uppspelning (SUNO_REPLAY=fil.jsonl): svaren serveras i inspelad ordning per
+metod + sökväg (värd ignoreras), utan nätverk och utan krediter.
+SUNO_REPLAY_SPEED: 1 = originaltempo (standard), 10 = tio gånger snabbare, 0 = ingen väntan.
+Är den (skalade) svarstiden längre än requestens läs-timeout kastas requests.ReadTimeout,
+så timeout- och deadlinebeteende går att återskapa. Vid SPEED=0 jämförs inspelad tid.
+Tar inspelningen slut för en URL serveras sista svaret igen (t.ex. slutstatus vid poll).
+Inspelade nätverksfel (timeout, anslutningsfel) kastas som samma undantag.
+SUNO_API_KEY måste vara satt även vid uppspelning, men värdet spelar ingen roll.
+
+  python apirecorder.py fil.jsonl      -> sammanfattning per endpoint och HTTP-status
+"""
+
+import os, sys, io, json, time, base64, hashlib, threading, collections
+from urllib.parse import urlsplit
+import requests
+
+# SUNO_RECORD/SUNO_REPLAY/SUNO_REPLAY_SPEED läses i make_session(), efter att .env lästs in
+RECORD_MAX_BYTES = int(os.getenv("SUNO_RECORD_MAX_BYTES", str(256 * 1024)))
+
+SCRUB_HEADERS = ("authorization", "x-api-key", "cookie", "set-cookie")
+SCRUBBED = "***"
+
+# En skrivlås per fil: daemonens arbetartrådar delar samma inspelning
+_file_locks = collections.defaultdict(threading.Lock)
+
+def _scrub_text(text, secrets):
+    for s in secrets:
+        if s:
+            text = text.replace(s, SCRUBBED)
+    return text
+
+def _scrub_headers(headers, secrets):
+    out = {}
+    for k, v in (headers or {}).items():
+        out[k] = SCRUBBED if k.lower() in SCRUB_HEADERS else _scrub_text(str(v), secrets)
+    return out
+
+def _key(method, url):
+    """Matchningsnyckel: metod + sökväg + query (värden kan skilja mellan inspelning och uppspelning)."""
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+def _encode_body(content, content_type, secrets, nbytes=None, sha256=None):
+    """
+    Textsvar sparas som text, binära som base64 (eller bara storlek om de är för stora).
+    content=None: kroppen buffrades inte (strömmad och för stor) – nbytes/sha256 används.
+    """
+    rec = {"body_bytes": len(content) if content is not None else nbytes}
+    if content is not None and ("json" in content_type or content_type.startswith("text/")):
+        try:
+            rec["body"] = _scrub_text(content.decode("utf-8"), secrets)
+            return rec
+        except UnicodeDecodeError:
+            pass
+    if content is not None and len(content) <= RECORD_MAX_BYTES:
+        rec["body_b64"] = base64.b64encode(content).decode("ascii")
+    else:
+        rec["body_sha256"] = sha256 or hashlib.sha256(content).hexdigest()
+    return rec
+
+def _read_timeout(timeout):
+    """Läs-timeouten ur requests timeout-argument (tal eller (connect, read)-tuple)."""
+    if isinstance(timeout, tuple):
+        return timeout[1] if len(timeout) > 1 else None
+    return timeout
+
+class _TeeRaw:
+    """
+    Ersätter resp.raw vid stream=True: bitarna går vidare till anroparen (iter_content)
+    och kopieras samtidigt (högst RECORD_MAX_BYTES buffras, resten bara räknas/hashas).
+    on_done(content|None, nbytes, sha256, complete) anropas en gång: när kroppen är slut
+    eller när svaret stängs.
+    """
+
+    def __init__(self, raw, on_done):
+        self._raw = raw
+        self._on_done = on_done
+        self._buf = bytearray()
+        self._n = 0
+        self._sha = hashlib.sha256()
+        self._done = False
+
+    def _take(self, chunk):
+        self._n += len(chunk)
+        self._sha.update(chunk)
+        if len(self._buf) <= RECORD_MAX_BYTES:
+            self._buf += chunk
+
+    def _finish(self, complete):
+        if self._done:
+            return
+        self._done = True
+        content = bytes(self._buf) if self._n <= RECORD_MAX_BYTES else None
+        self._on_done(content, self._n, self._sha.hexdigest(), complete)
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            self._take(chunk)
+            yield chunk
+        self._finish(True)
+
+    def read(self, *args, **kwargs):
+        chunk = self._raw.read(*args, **kwargs)
+        if chunk:
+            self._take(chunk)
+        else:
+            self._finish(True)
+        return chunk
+
+    def close(self):
+        self._finish(False)
+        self._raw.close()
+
+    def release_conn(self):
+        self._finish(False)
+        release = getattr(self._raw, "release_conn", None)
+        if release:
+            release()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+class _ReplayRaw(io.BytesIO):
+    """Inspelad kropp som läses i bitar med inspelat tempo (så deadline per bit kan slå till)."""
+
+    def __init__(self, body, seconds):
+        super().__init__(body)
+        self._sec_per_byte = seconds / len(body) if body and seconds > 0 else 0.0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        if chunk and self._sec_per_byte:
+            time.sleep(len(chunk) * self._sec_per_byte)
+        return chunk
+
+def _decode_body(rec):
+    if "body" in rec:
+        return rec["body"].encode("utf-8")
+    if "body_b64" in rec:
+        return base64.b64decode(rec["body_b64"])
+    return bytes(rec.get("body_bytes", 0))
+
+class RecordingSession(requests.Session):
+    """requests.Session som skriver varje request/svar-par till en JSONL-fil."""
+
+    def __init__(self, path, secrets=()):
+        super().__init__()
+        self.path = path
+        self.secrets = [s for s in secrets if s]
+        self._t0 = time.time()
+
+    def _write(self, rec):
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with _file_locks[os.path.abspath(self.path)]:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def request(self, method, url, **kwargs):
+        rec = {
+            "t": round(time.time() - self._t0, 3),
+            "method": method.upper(),
+            "url": _scrub_text(url, self.secrets),
+            "req_headers": _scrub_headers(kwargs.get("headers"), self.secrets),
+        }
+        if kwargs.get("json") is not None:
+            rec["req_json"] = json.loads(_scrub_text(json.dumps(kwargs["json"], ensure_ascii=False), self.secrets))
+        t0 = time.perf_counter()
+        try:
+            resp = super().request(method, url, **kwargs)
+        except requests.RequestException as e:
+            rec["elapsed"] = round(time.perf_counter() - t0, 3)
+            rec["error"] = type(e).__name__
+            rec["error_msg"] = _scrub_text(str(e), self.secrets)
+            self._write(rec)
+            raise
+        t1 = time.perf_counter()
+        rec["elapsed"] = round(t1 - t0, 3)
+        rec["status"] = resp.status_code
+        rec["reason"] = resp.reason
+        rec["headers"] = _scrub_headers(resp.headers, self.secrets)
+        content_type = resp.headers.get("Content-Type", "")
+
+        if not kwargs.get("stream"):
+            rec.update(_encode_body(resp.content, content_type, self.secrets))
+            self._write(rec)
+            return resp
+
+        # stream=True: läs inte kroppen här – anroparen läser i bitar (deadline per bit)
+        def on_done(content, nbytes, sha256, complete):
+            rec["body_sec"] = round(time.perf_counter() - t1, 3)
+            if not complete:
+                rec["incomplete"] = True
+            rec.update(_encode_body(content, content_type, self.secrets, nbytes, sha256))
+            self._write(rec)
+
+        resp.raw = _TeeRaw(resp.raw, on_done)
+        return resp
+
+class ReplaySession(requests.Session):
+    """requests.Session som serverar inspelade svar i stället för att gå ut på nätet."""
+
+    def __init__(self, path, speed=1.0):
+        super().__init__()
+        self.path = path
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._queues = collections.defaultdict(collections.deque)
+        self._last = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                    self._queues[_key(rec["method"], rec["url"])].append(rec)
+                except (ValueError, KeyError):
+                    continue    # trasig rad (avbruten inspelning) ignoreras
+
+    def _next(self, key):
+        with self._lock:
+            q = self._queues.get(key)
+            if q:
+                rec = q.popleft()
+                self._last[key] = rec
+                return rec
+            return self._last.get(key)
+
+    def request(self, method, url, **kwargs):
+        rec = self._next(_key(method, url))
+        if rec is None:
+            raise requests.ConnectionError(f"Ingen inspelning för {_key(method, url)} i {self.path}")
+        elapsed = rec.get("elapsed") or 0.0
+        scaled = elapsed / self.speed if self.speed > 0 else 0.0
+        read_timeout = _read_timeout(kwargs.get("timeout"))
+        if read_timeout is not None and (scaled if self.speed > 0 else elapsed) > read_timeout:
+            time.sleep(min(scaled, read_timeout))
+            raise requests.ReadTimeout(
+                f"Uppspelning: svar efter {elapsed:.3f}s (skalat {scaled:.3f}s) > läs-timeout {read_timeout:.3f}s")
+        if scaled:
+            time.sleep(scaled)
+        if rec.get("error"):
+            exc = getattr(requests.exceptions, rec["error"], requests.ConnectionError)
+            raise exc(rec.get("error_msg", "inspelat fel"))
+
+        resp = requests.Response()
+        resp.status_code = rec.get("status", 200)
+        resp.headers = requests.structures.CaseInsensitiveDict(rec.get("headers", {}))
+        body_sec = (rec.get("body_sec") or 0.0) / self.speed if self.speed > 0 else 0.0
+        resp.raw = _ReplayRaw(_decode_body(rec), body_sec)
+        resp.url = url
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        resp.reason = rec.get("reason", "")
+        resp.request = requests.Request(method, url).prepare()
+        return resp
+
+def make_session(secrets=()):
+    """Session enligt miljön: uppspelning, inspelning eller vanlig requests.Session."""
+    replay_file = os.getenv("SUNO_REPLAY", "")
+    record_file = os.getenv("SUNO_RECORD", "")
+    if replay_file:
+        return ReplaySession(replay_file, speed=float(os.getenv("SUNO_REPLAY_SPEED", "1")))
+    if record_file:
+        return RecordingSession(record_file, secrets=list(secrets) + [os.getenv("SUNO_API_KEY", "")])
+    return requests.Session()
+
+# ---------- CLI ----------
+
+def main():
+    if len(sys.argv) < 2:
+        print("Användning: python apirecorder.py <inspelning.jsonl>")
+        sys.exit(1)
+    stats = collections.OrderedDict()
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            path = urlsplit(rec.get("url", "")).path
+            s = stats.setdefault(f"{rec.get('method')} {path}", {"n": 0, "sec": 0.0, "codes": collections.Counter()})
+            s["n"] += 1
+            s["sec"] += rec.get("elapsed") or 0.0
+            s["codes"][rec.get("error") or rec.get("status")] += 1
+    for ep, s in stats.items():
+        codes = ", ".join(f"{c}×{n}" for c, n in s["codes"].most_common())
+        print(f"{ep:50s} {s['n']:6d} st  snitt {s['sec'] / s['n']:.3f}s  [{codes}]")
+
+if __name__ == "__main__":
+    main()
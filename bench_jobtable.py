@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_jobtable.py — Jämför minne och serialisering: dict-items vs JobTable.
+
+Kör:  python bench_jobtable.py [antal_varianter]   (standard 100000)
+
+Mäter:
+  * minne för statusstrukturen (tracemalloc), direkt efter bygget och efter en statusskrivning
+    (create/poll skriver statusfilen efter varje item, så det är läget under en körning)
+  * full serialisering (json.dump indent=2 vs JobTable.dumps)
+  * statusskrivning efter en ändrad item (det vanliga fallet i create/poll-looparna)
+Kontrollerar också att JobTable ger exakt samma JSON-text som dict-varianten.
+"""
+
+import sys, json, time, datetime, tracemalloc
+
+from jobtable import JobTable
+
+def _ts():
+    return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def make_fields(n):
+    """Genererar items som create_songs.py gör: några titlar, flera varianter var."""
+    for i in range(n):
+        idx = i // 4 + 1
+        yield {
+            "index": idx,
+            "variant": i % 4 + 1,
+            "title": f"Song number {idx % 500}",
+            "prompt_text": f"Uptempo 60s pop-rock; hook@18s; tambourine; take {idx % 500}",
+            "job_id": f"{i:012x}",
+            "phase": "POLL",
+            "status": "POLLING",
+            "http_status": 200,
+            "error_code": None,
+            "error_expl": None,
+            "retries": 3,
+            "next_retry_at": None,
+            "deadline_at": _ts(),
+            "last_update": _ts(),
+        }
+
+def build_dicts(n):
+    return {"meta": {"created_at": _ts(), "overall_status": "POLLING"}, "items": list(make_fields(n))}
+
+def build_table(n):
+    table = JobTable({"created_at": _ts(), "overall_status": "POLLING"})
+    for fields in make_fields(n):
+        table.add(fields)
+    return table
+
+def measure_memory(builder, dumper, n):
+    """(objekt, minne efter bygget, minne efter en dump) – dumptexten kastas som i save_status()."""
+    tracemalloc.start()
+    obj = builder(n)
+    built, _peak = tracemalloc.get_traced_memory()
+    dumper(obj)
+    after_dump, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, built, after_dump
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"=== bench_jobtable.py: {n} varianter ===")
+
+    dicts, mem_d, mem_d2 = measure_memory(build_dicts, lambda d: json.dumps(d, indent=2), n)
+    table, mem_t, mem_t2 = measure_memory(build_table, lambda t: t.dumps(), n)
+    print(f"Minne   dict-items : {mem_d / 1e6:8.1f} MB  efter dump {mem_d2 / 1e6:8.1f} MB")
+    print(f"Minne   JobTable   : {mem_t / 1e6:8.1f} MB  efter dump {mem_t2 / 1e6:8.1f} MB  ({mem_t2 / mem_d2:.0%})")
+
+    _, t_d = timed(lambda: json.dumps(dicts, indent=2))
+    _, t_t = timed(table.dumps)
+    print(f"Dump    dict-items : {t_d:8.3f} s")
+    print(f"Dump    JobTable   : {t_t:8.3f} s")
+
+    # En ändrad item -> ny statusskrivning
+    dicts["items"][n // 2]["status"] = "DONE"
+    table.items[n // 2]["status"] = "DONE"
+    _, t_d1 = timed(lambda: json.dumps(dicts, indent=2))
+    _, t_t1 = timed(table.dumps)
+    print(f"Skriv   dict-items : {t_d1:8.3f} s  (efter 1 ändrad item)")
+    print(f"Skriv   JobTable   : {t_t1:8.3f} s  (efter 1 ändrad item)")
+
+    # Samma innehåll -> samma text (tidsstämplarna skiljer mellan de två byggena ovan)
+    text_d = json.dumps(dicts, indent=2)
+    text_t = JobTable.from_json(dicts).dumps()
+    if text_d != text_t:
+        print("✗ JSON-texten skiljer sig mellan dict-items och JobTable!")
+        sys.exit(1)
+    print("✓ Identisk JSON-text")
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,16 @@
 """
 create_songs.py — Robust Suno create med 503-hantering, loggning och tydlig status.
 Windows-fokus. Kräver: requests (pip install requests), .env med SUNO_API_KEY.
+Kan även importeras: run_create() används av suno_daemon.py.
 """
 
-import os, sys, json, time, datetime, random
-import requests
+import os, sys, json, time, datetime, random, atexit, shutil, threading, argparse, itertools, math, string
+
+from jobtable import JobTable
+from tracing import Tracer
+from deadlines import deadline_from_now, deadline_passed, request_timeout, capped_sleep
+import runs
+import apirecorder
 
 # ---------- Konfiguration & .env ----------
 
@@ -37,29 +43,57 @@ load_env_envfile()
 # Miljövariabler / standarder
 SUNO_API_BASE = os.getenv("SUNO_API", "https://api.sunoapi.org").rstrip("/")
 SUNO_API_GENERATE = f"{SUNO_API_BASE}/api/v1/generate"
-TIMEOUT_CREATE = int(os.getenv("TIMEOUT_CREATE", "30"))
+# Timeouts: separat connect- och läs-timeout per request (sekunder)
+TIMEOUT_CONNECT = float(os.getenv("TIMEOUT_CONNECT", "10"))
+TIMEOUT_CREATE  = float(os.getenv("TIMEOUT_CREATE",  "30"))
+
+# Tidsbudget per jobb, 0 = ingen gräns. Gäller create här; poll_songs.py startar en ny
+# budget för poll + nedladdning när jobbet börjar pollas
+JOB_DEADLINE_SEC = float(os.getenv("JOB_DEADLINE_SEC", "3600"))
+
+# Minsta tid mellan två skrivningar av statusfilen (sekunder); fasbyten skrivs alltid
+STATUS_WRITE_SEC = float(os.getenv("STATUS_WRITE_SEC", "2"))
 
 BACKOFF_BASE_SEC   = float(os.getenv("BACKOFF_BASE_SEC", "1.5"))
 BACKOFF_CAP_SEC    = float(os.getenv("BACKOFF_CAP_SEC",  "30.0"))
 JITTER_SEC         = float(os.getenv("JITTER_SEC",       "0.5"))
 MAX_RETRIES_CREATE = int(os.getenv("MAX_RETRIES_CREATE", "6"))
 
+# Opt-in tracing (Chrome trace / Perfetto JSON) av create-förloppet
+TRACE_ENABLED = os.getenv("TRACE", "0").lower() in ("1", "true", "yes", "y")
+TRACE_DIR     = os.getenv("TRACE_DIR", "trace")
+
 PROMPT_FILE = "sunoprompt_aktiv.json"
 STATUS_FILE = "jobid_aktiv.json"
 LOG_FILE    = "log.txt"
 
+TRACER = Tracer("create_songs.py", enabled=TRACE_ENABLED)
+
+# Sätts för att avbryta pågående create (daemon vid nedstängning); sömn avbryts direkt
+STOP = threading.Event()
+
+RETRY_STATES = ("CREATING", "RETRYING_RATE", "RETRYING_MAINT", "RETRYING_SERVER")
+
 # ---------- Logg ----------
 
 _log_initialized = False
+_log_local = threading.local()
 
 def _ts():
     return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
 
+def log_file():
+    """Aktuell loggfil: per tråd om set_log_file() anropats (daemon), annars LOG_FILE."""
+    return getattr(_log_local, "path", None) or LOG_FILE
+
+def set_log_file(path):
+    _log_local.path = path
+
 def init_log(reset=True):
     global _log_initialized
     mode = "w" if reset else "a"
     try:
-        with open(LOG_FILE, mode, encoding="utf-8") as lf:
+        with open(log_file(), mode, encoding="utf-8") as lf:
             lf.write(f"{_ts()} - === create_songs.py start ===\n")
             lf.write(f"{_ts()} - API_BASE={SUNO_API_BASE}  GENERATE={SUNO_API_GENERATE}\n")
         _log_initialized = True
@@ -73,13 +107,31 @@ def log(msg):
     try:
         if not _log_initialized:
             init_log(reset=True)
-        with open(LOG_FILE, "a", encoding="utf-8") as lf:
+        with open(log_file(), "a", encoding="utf-8") as lf:
             lf.write(s + "\n")
     except Exception as e:
         print(f"⚠️  Kunde inte skriva till logg: {e}")
 
 # ---------- Hjälp ----------
 
+def save_status(job_status, force=False):
+    """
+    Statusfilen skrivs högst var STATUS_WRITE_SEC:e sekund (hela tabellen kodas om).
+    force=True vid fasbyte, stopp och fel som avbryter körningen.
+    """
+    if not force and not job_status.checkpoint_due(STATUS_WRITE_SEC):
+        return
+    with TRACER.span("status_write", cat="io"):
+        job_status.dump()
+
+def save_trace():
+    ts = datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    try:
+        path = TRACER.save(os.path.join(TRACE_DIR, f"create_{ts}.json"))
+        log(f"✓ Trace sparad → {path}")
+    except Exception as e:
+        log(f"⚠️  Kunde inte spara trace: {e}")
+
 def ensure_directories():
     for d in ("out", "job"):
         if not os.path.isdir(d):
@@ -93,6 +145,104 @@ def load_api_key():
     load_env_envfile()
     return os.getenv("SUNO_API_KEY")
 
+# ---------- Mallar & parametergrid ----------
+#
+# En promptpost kan ha "grid": {"style": ["pop", "rock"], "tempo": ["90", "120"], ...}.
+# Posten expanderas till en post per kombination (kartesisk produkt, i ordning).
+# {nyckel} i title/prompt/style/params ersätts med kombinationens värde. style/instrumental/
+# customMode i griden sätts dessutom direkt på posten (om posten inte själv har fältet).
+# Övriga gridnycklar som inte används i någon mall läggs till i params som key=value
+# (och hamnar därmed i prompten via build_payload).
+# Den expanderade posten får "grid": {nyckel: värde} för just sin kombination, och den
+# sparas på itemet i statusfilen så att varianterna går att skilja åt i efterhand.
+
+TEMPLATE_FIELDS = ("title", "prompt", "style", "params")
+GRID_DIRECT_KEYS = ("style", "instrumental", "customMode")
+
+class _KeepMissing(dict):
+    """format_map-dict som lämnar okända {platshållare} orörda."""
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+_FORMATTER = string.Formatter()
+
+def _grid_axes(entry):
+    """[(nyckel, [värden...]), ...] för postens grid; skalärer blir en lista med ett värde."""
+    grid = entry.get("grid")
+    if not isinstance(grid, dict):
+        return []
+    return [(k, v if isinstance(v, list) else [v]) for k, v in grid.items()]
+
+def grid_size(entry):
+    return math.prod(len(vals) for _k, vals in _grid_axes(entry))
+
+def _placeholders(entry):
+    used = set()
+    for field in TEMPLATE_FIELDS:
+        val = entry.get(field)
+        if isinstance(val, str):
+            try:
+                used.update(name for _lit, name, _spec, _conv in _FORMATTER.parse(val) if name)
+            except ValueError:
+                pass    # ensam { eller } – ingen mall
+    return used
+
+def _fill(text, values):
+    try:
+        return text.format_map(values)
+    except (ValueError, IndexError, AttributeError):
+        return text     # ogiltig mall skickas som den är
+
+def expand_prompts(prompts):
+    """
+    Generator: (index, post) för varje konkret promptpost. Grids expanderas lazy med
+    itertools.product, så en grid med 50k kombinationer hålls aldrig i minnet som poster.
+    index räknas löpande över alla kombinationer (samma ordning varje gång -> resume fungerar).
+    """
+    idx = 0
+    for entry in prompts:
+        axes = _grid_axes(entry)
+        if not axes:
+            idx += 1
+            yield idx, entry
+            continue
+        used = _placeholders(entry)
+        keys = [k for k, _vals in axes]
+        base = {k: v for k, v in entry.items() if k != "grid"}
+        for combo in itertools.product(*(vals for _k, vals in axes)):
+            values = _KeepMissing(zip(keys, (str(v) for v in combo)))
+            out = dict(base)
+            out["grid"] = dict(zip(keys, combo))
+            for field in TEMPLATE_FIELDS:
+                if isinstance(out.get(field), str):
+                    out[field] = _fill(out[field], values)
+            extra = []
+            for k, v in zip(keys, combo):
+                if k in GRID_DIRECT_KEYS:
+                    out.setdefault(k, v)
+                elif k not in used:
+                    extra.append(f"{k}={v}")
+            if extra:
+                params = (out.get("params") or "").strip()
+                # parse_params delar på '|' om det finns, annars ','
+                sep = "," if "," in params and "|" not in params else " | "
+                out["params"] = sep.join(p for p in [params] + extra if p)
+            idx += 1
+            yield idx, out
+
+def count_jobs(prompt_data):
+    """Antal renderingar en promptfil ger (count × gridstorlek, med meta.default_count som standard)."""
+    default_count = prompt_data.get("meta", {}).get("default_count", 1)
+    if not isinstance(default_count, int) or default_count < 1:
+        default_count = 1
+    total = 0
+    for entry in prompt_data.get("prompts", []):
+        c = entry.get("count", default_count)
+        if not isinstance(c, int) or c < 1:
+            c = 1
+        total += c * grid_size(entry)
+    return total
+
 def parse_params(params_str):
     """
     Tolka 'key=value' par separerade med '|' eller ','.
@@ -183,26 +333,32 @@ def build_payload(entry):
 
 # ---------- Körning ----------
 
-def main():
-    init_log(reset=True)
-    ensure_directories()
-
+def run_create(prompt_file=PROMPT_FILE, status_file=STATUS_FILE, archive_dir=".",
+               session=None, resume=False, batch_id=None):
+    """
+    Skapar alla jobb i prompt_file och skriver status till status_file.
+    batch_id: id i meta (styr lagringslayouten); standard är starttiden.
+    session: requests.Session att återanvända (varma anslutningar), annars skapas en.
+    resume:  fortsätt från befintlig statusfil; redan skapade/misslyckade varianter hoppas över.
+    Returnerar 0 = klart, 1 = fel som stoppar batchen, 2 = avbruten via STOP
+    (statusfilen är då checkpoint för resume).
+    """
     api_key = load_api_key()
     if not api_key:
         log("🚫 SUNO_API_KEY saknas. Lägg den i .env (SUNO_API_KEY=...)")
-        sys.exit(1)
+        return 1
 
-    if not os.path.isfile(PROMPT_FILE):
-        log(f"🚫 Hittar inte {PROMPT_FILE}. Skapa filen och försök igen.")
-        sys.exit(1)
+    if not os.path.isfile(prompt_file):
+        log(f"🚫 Hittar inte {prompt_file}. Skapa filen och försök igen.")
+        return 1
 
     # Läs promptlista
     try:
-        with open(PROMPT_FILE, "r", encoding="utf-8") as f:
+        with open(prompt_file, "r", encoding="utf-8") as f:
             prompt_data = json.load(f)
     except Exception as e:
-        log(f"🚫 Kunde inte läsa {PROMPT_FILE}: {e}")
-        sys.exit(1)
+        log(f"🚫 Kunde inte läsa {prompt_file}: {e}")
+        return 1
 
     prompts = prompt_data.get("prompts", [])
     meta    = prompt_data.get("meta", {})
@@ -210,25 +366,29 @@ def main():
     if not isinstance(default_count, int) or default_count < 1:
         default_count = 1
 
-    # Statusstruktur
-    job_status = {
-        "meta": {
+    # Statusstruktur (vid resume: fortsätt på checkpointen)
+    existing = {}
+    if resume and os.path.isfile(status_file):
+        try:
+            job_status = JobTable.load(status_file)
+        except Exception as e:
+            log(f"🚫 Kunde inte läsa {status_file}: {e}")
+            return 1
+        job_status.meta["overall_status"] = "CREATING"
+        job_status.meta["note"] = "Återupptar jobb mot Suno API..."
+        existing = {(itm.get("index"), itm.get("variant")): itm for itm in job_status}
+        log(f"• Återupptar från {status_file} ({len(existing)} varianter sedan tidigare)")
+    else:
+        job_status = JobTable({
             "created_at": _ts(),
+            "batch_id": batch_id or datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S"),
             "overall_status": "CREATING",
             "note": "Startar jobb mot Suno API...",
             "api_base": SUNO_API_BASE
-        },
-        "items": []
-    }
-    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-        json.dump(job_status, f, indent=2)
+        }, status_file)
+    save_status(job_status)
 
-    total_jobs = 0
-    for entry in prompts:
-        c = entry.get("count", default_count)
-        if not isinstance(c, int) or c < 1:
-            c = 1
-        total_jobs += c
+    total_jobs = count_jobs(prompt_data)
 
     log(f"• Startar jobb mot API: {SUNO_API_GENERATE}")
     log(f"• Antal renderingar som skapas: {total_jobs}")
@@ -237,66 +397,111 @@ def main():
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
+    http = session if session is not None else apirecorder.make_session()
 
     job_counter = 0
-    for idx, entry in enumerate(prompts, start=1):
+    lane_base = TRACER.lane_block()
+    stopped = False
+    for idx, entry in expand_prompts(prompts):
+        if stopped:
+            break
         title       = (entry.get("title") or "Untitled").strip()
         count       = entry.get("count", default_count)
         if not isinstance(count, int) or count < 1:
             count = 1
+        built = None    # payload byggs en gång per kombination och delas av alla varianter
 
         for variant in range(1, count + 1):
+            if STOP.is_set():
+                stopped = True
+                break
             job_counter += 1
-            # Bygg payload
-            payload, perr = build_payload(entry)
-            item = {
-                "index": idx,
-                "variant": variant,
-                "title": title,
-                "prompt_text": (entry.get("prompt") or "").strip(),
-                "job_id": None,
-                "phase": "CREATE",
-                "status": "CREATING",
-                "http_status": None,
-                "error_code": None,
-                "error_expl": None,
-                "retries": 0,
-                "next_retry_at": None,
-                "last_update": _ts()
-            }
-            job_status["items"].append(item)
-            with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                json.dump(job_status, f, indent=2)
+
+            item = existing.get((idx, variant))
+            if item is not None and (item.get("job_id") or item.get("status") not in RETRY_STATES):
+                # Redan skapad eller slutgiltigt misslyckad i en tidigare körning
+                continue
+
+            TRACER.set_lane(lane_base + job_counter, f"{idx:03d} {title} v{variant}")
+            TRACER.begin("create", cat="item", title=title, variant=variant)
+            if built is None:
+                built = build_payload(entry)
+            payload, perr = built
+            if item is not None:
+                item["status"] = "CREATING"
+                item["last_update"] = _ts()
+            else:
+                item = job_status.add({
+                    "index": idx,
+                    "variant": variant,
+                    "title": title,
+                    "prompt_text": (entry.get("prompt") or "").strip(),
+                    "job_id": None,
+                    "phase": "CREATE",
+                    "status": "CREATING",
+                    "http_status": None,
+                    "error_code": None,
+                    "error_expl": None,
+                    "retries": 0,
+                    "next_retry_at": None,
+                    "deadline_at": deadline_from_now(JOB_DEADLINE_SEC),
+                    "last_update": _ts()
+                })
+                if isinstance(entry.get("grid"), dict):
+                    item["grid"] = entry["grid"]
+            save_status(job_status)
 
             if perr:
                 item["status"] = "CREATE_FAILED"
                 item["error_code"] = 400
                 item["error_expl"] = perr
                 item["last_update"] = _ts()
-                with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(job_status, f, indent=2)
+                save_status(job_status)
                 log(f"✗ [{job_counter}/{total_jobs}] Skippade (payload-fel): {perr}")
+                TRACER.end(status=item["status"])
                 continue
 
             # Retry-loop
             attempt = 0
+            create_t0 = time.perf_counter()
             while attempt < MAX_RETRIES_CREATE:
+                if STOP.is_set():
+                    break
+                if deadline_passed(item):
+                    item["status"] = "TIMED_OUT"
+                    item["error_code"] = "DEADLINE"
+                    item["error_expl"] = f"Tidsbudget ({JOB_DEADLINE_SEC:.0f}s) slut under create"
+                    item["last_update"] = _ts()
+                    save_status(job_status)
+                    log(f"✗ [{job_counter}/{total_jobs}] TIMED_OUT – deadline passerad under create.")
+                    break
+
                 attempt += 1
                 item["retries"] = attempt - 1
                 item["last_update"] = _ts()
-                with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(job_status, f, indent=2)
+                save_status(job_status)
 
                 try:
                     log(f"• [{job_counter}/{total_jobs}] Skickar create för \"{title}\" (försök {attempt})...")
-                    resp = requests.post(SUNO_API_GENERATE, headers=headers, json=payload, timeout=TIMEOUT_CREATE)
+                    with TRACER.span("POST generate", cat="http", attempt=attempt) as sp:
+                        resp = http.post(SUNO_API_GENERATE, headers=headers, json=payload,
+                                             timeout=request_timeout(item, TIMEOUT_CONNECT, TIMEOUT_CREATE))
+                        sp["http_status"] = resp.status_code
                 except Exception as e:
+                    if deadline_passed(item):
+                        # Timeouten kapades av jobbets deadline
+                        item["status"] = "TIMED_OUT"
+                        item["error_code"] = "DEADLINE"
+                        item["error_expl"] = f"Tidsbudget ({JOB_DEADLINE_SEC:.0f}s) slut under create: {e}"
+                        item["last_update"] = _ts()
+                        save_status(job_status)
+                        log(f"✗ [{job_counter}/{total_jobs}] TIMED_OUT – deadline passerad under create.")
+                        break
                     item["status"] = "CREATE_FAILED"
                     item["error_code"] = "EXC"
                     item["error_expl"] = f"Nätverksfel: {e}"
                     item["last_update"] = _ts()
-                    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                        json.dump(job_status, f, indent=2)
+                    save_status(job_status)
                     log(f"✗ [{job_counter}/{total_jobs}] Nätverksfel: {e}")
                     break
 
@@ -319,8 +524,7 @@ def main():
                         item["error_code"] = inner
                         item["error_expl"] = msg
                         item["last_update"] = _ts()
-                        with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                            json.dump(job_status, f, indent=2)
+                        save_status(job_status)
                         log(f"✗ [{job_counter}/{total_jobs}] API fel (code {inner}): {msg}")
                         break
 
@@ -328,9 +532,13 @@ def main():
                     if task_id:
                         item["job_id"] = task_id
                         item["status"] = "QUEUED"
+                        # Tider för kapacitetsplanering (plan_batch.py)
+                        item["queued_at"] = _ts()
+                        item["create_sec"] = round(time.perf_counter() - create_t0, 3)
                         item["last_update"] = _ts()
-                        with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                            json.dump(job_status, f, indent=2)
+                        # job_id = betald rendering: journalförs direkt, statusfilen skrivs throttlat
+                        job_status.journal(item)
+                        save_status(job_status)
                         log(f"✓ [{job_counter}/{total_jobs}] Startade job {task_id}  ({title} v{variant})")
                         break
                     else:
@@ -340,8 +548,7 @@ def main():
                         item["error_code"] = 200
                         item["error_expl"] = msg
                         item["last_update"] = _ts()
-                        with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                            json.dump(job_status, f, indent=2)
+                        save_status(job_status)
                         log(f"✗ [{job_counter}/{total_jobs}] 200 utan taskId: {msg}")
                         break
 
@@ -350,22 +557,20 @@ def main():
                     item["status"] = "CREATE_FAILED"
                     item["error_code"] = 401
                     item["error_expl"] = "Ogiltig API-nyckel (401)"
-                    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                        json.dump(job_status, f, indent=2)
+                    save_status(job_status)
                     log(f"🚫 [{job_counter}/{total_jobs}] 401 Unauthorized – kontrollera SUNO_API_KEY i .env")
-                    job_status["meta"]["overall_status"] = "CREATE_FAILED"
-                    job_status["meta"]["note"] = "Fel API-nyckel. Avbröt skapande."
-                    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                        json.dump(job_status, f, indent=2)
-                    sys.exit(1)
+                    job_status.meta["overall_status"] = "CREATE_FAILED"
+                    job_status.meta["note"] = "Fel API-nyckel. Avbröt skapande."
+                    save_status(job_status, force=True)
+                    TRACER.end(status=item["status"])
+                    return 1
 
                 if code == 413:
                     item["status"] = "CREATE_FAILED"
                     item["error_code"] = 413
                     item["error_expl"] = "prompt för lång (413)"
                     item["last_update"] = _ts()
-                    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                        json.dump(job_status, f, indent=2)
+                    save_status(job_status)
                     log(f"✗ [{job_counter}/{total_jobs}] 413 Payload Too Large – korta prompten.")
                     break
 
@@ -381,23 +586,22 @@ def main():
                         item["error_code"] = 429
                         item["error_expl"] = "Slut på krediter"
                         item["last_update"] = _ts()
-                        with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                            json.dump(job_status, f, indent=2)
+                        save_status(job_status)
                         log(f"🚫 [{job_counter}/{total_jobs}] Inga krediter kvar – avbryter.")
-                        job_status["meta"]["overall_status"] = "ON_HOLD_CREDITS"
-                        job_status["meta"]["note"] = "Avbruten - saknar krediter."
-                        with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                            json.dump(job_status, f, indent=2)
-                        sys.exit(1)
+                        job_status.meta["overall_status"] = "ON_HOLD_CREDITS"
+                        job_status.meta["note"] = "Avbruten - saknar krediter."
+                        save_status(job_status, force=True)
+                        TRACER.end(status=item["status"])
+                        return 1
                     # vanlig ratelimit -> backoff
                     sleep_time = min(BACKOFF_CAP_SEC, BACKOFF_BASE_SEC * (2 ** (attempt-1))) + random.uniform(0, JITTER_SEC)
                     item["status"] = "RETRYING_RATE"
                     item["error_code"] = 429
                     item["next_retry_at"] = (_ts())
-                    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                        json.dump(job_status, f, indent=2)
+                    save_status(job_status)
                     log(f"… RETRYING_RATE (HTTP {code}) – retry om {sleep_time:.1f}s")
-                    time.sleep(sleep_time)
+                    with TRACER.span("backoff", cat="sleep", http_status=code, seconds=round(sleep_time, 3)):
+                        capped_sleep(item, sleep_time, STOP)
                     item["status"] = "CREATING"
                     continue
 
@@ -406,10 +610,10 @@ def main():
                     sleep_time = min(BACKOFF_CAP_SEC, BACKOFF_BASE_SEC * (2 ** (attempt-1))) + random.uniform(0, JITTER_SEC)
                     item["status"] = "RETRYING_MAINT"
                     item["error_code"] = 455
-                    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                        json.dump(job_status, f, indent=2)
+                    save_status(job_status)
                     log(f"… RETRYING_MAINT (HTTP 455) – underhåll – retry om {sleep_time:.1f}s")
-                    time.sleep(sleep_time)
+                    with TRACER.span("backoff", cat="sleep", http_status=code, seconds=round(sleep_time, 3)):
+                        capped_sleep(item, sleep_time, STOP)
                     item["status"] = "CREATING"
                     continue
 
@@ -418,10 +622,10 @@ def main():
                     sleep_time = min(BACKOFF_CAP_SEC, BACKOFF_BASE_SEC * (2 ** (attempt-1))) + random.uniform(0, JITTER_SEC)
                     item["status"] = "RETRYING_SERVER"
                     item["error_code"] = code
-                    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                        json.dump(job_status, f, indent=2)
+                    save_status(job_status)
                     log(f"… RETRYING_SERVER (HTTP {code}) – retry om {sleep_time:.1f}s")
-                    time.sleep(sleep_time)
+                    with TRACER.span("backoff", cat="sleep", http_status=code, seconds=round(sleep_time, 3)):
+                        capped_sleep(item, sleep_time, STOP)
                     item["status"] = "CREATING"
                     continue
 
@@ -431,51 +635,103 @@ def main():
                 item["error_code"] = code
                 item["error_expl"] = msg if msg else "Okänt fel"
                 item["last_update"] = _ts()
-                with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(job_status, f, indent=2)
+                save_status(job_status)
                 log(f"✗ [{job_counter}/{total_jobs}] HTTP {code} – {msg}")
                 break
 
+            # Avbruten mitt i försöken? lämna som CREATING så att resume tar om varianten
+            if STOP.is_set() and item["status"] in RETRY_STATES:
+                item["status"] = "CREATING"
+                item["last_update"] = _ts()
+                save_status(job_status)
+                TRACER.end(status="INTERRUPTED")
+                stopped = True
+                break
+
             # Max retries? markera misslyckat
-            if item["status"] in ("CREATING", "RETRYING_RATE", "RETRYING_MAINT", "RETRYING_SERVER"):
+            if item["status"] in RETRY_STATES:
                 item["status"] = "CREATE_FAILED"
                 item["error_code"] = "MAX_RETRIES"
                 item["error_expl"] = "Max försök uppnådda"
                 item["last_update"] = _ts()
-                with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(job_status, f, indent=2)
+                save_status(job_status)
                 log(f"✗ [{job_counter}/{total_jobs}] Misslyckades efter max försök.")
 
+            TRACER.end(status=item["status"], job_id=item["job_id"])
+
+    if stopped:
+        job_status.meta["overall_status"] = "CREATE_INTERRUPTED"
+        job_status.meta["note"] = "Avbruten - statusfilen är checkpoint, fortsätt med resume."
+        save_status(job_status, force=True)
+        log("⏸ create avbruten – kvarvarande varianter skapas vid resume.")
+        return 2
+
     # Summera
-    all_failed = all(itm["status"] in ("CREATE_FAILED","ON_HOLD_CREDITS") for itm in job_status["items"]) or (len(job_status["items"])==0)
+    all_failed = all(itm["status"] in ("CREATE_FAILED","ON_HOLD_CREDITS","TIMED_OUT") for itm in job_status) or (len(job_status)==0)
     if all_failed:
-        job_status["meta"]["overall_status"] = "CREATE_FAILED"
-        job_status["meta"]["note"] = "Inga jobb startades. Se fel i listan."
+        job_status.meta["overall_status"] = "CREATE_FAILED"
+        job_status.meta["note"] = "Inga jobb startades. Se fel i listan."
     else:
-        job_status["meta"]["overall_status"] = "READY_TO_POLL"
-        job_status["meta"]["note"] = "Skapade jobb - redo för polling."
-    job_status["meta"]["last_create"] = _ts()
+        job_status.meta["overall_status"] = "READY_TO_POLL"
+        job_status.meta["note"] = "Skapade jobb - redo för polling."
+    job_status.meta["last_create"] = _ts()
 
-    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-        json.dump(job_status, f, indent=2)
+    save_status(job_status, force=True)
 
     # Arkivera
     ts = datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-    archive_prompt = f"sp_{ts}.json"
-    archive_jobids = f"jobid_{ts}.json"
+    archive_prompt = os.path.join(archive_dir, f"sp_{ts}.json")
+    archive_jobids = os.path.join(archive_dir, f"jobid_{ts}.json")
     try:
         # kopiera promptfilen (behåll original om man vill loopa manuellt)
-        if os.path.isfile(PROMPT_FILE):
-            import shutil
-            shutil.copy2(PROMPT_FILE, archive_prompt)
-        with open(archive_jobids, "w", encoding="utf-8") as f:
-            json.dump(job_status, f, indent=2)
+        if os.path.isfile(prompt_file):
+            shutil.copy2(prompt_file, archive_prompt)
+        job_status.dump(archive_jobids)
         log(f"✓ Arkiverade prompts → {archive_prompt}")
         log(f"✓ Arkiverade job IDs → {archive_jobids}")
     except Exception as e:
         log(f"⚠️  Arkivering misslyckades: {e}")
 
     log("=== create_songs.py klart ===")
+    return 0
+
+def main():
+    global LOG_FILE, TRACE_DIR
+    parser = argparse.ArgumentParser(description="Skapa Suno-jobb från en promptfil.")
+    parser.add_argument("--prompt", help=f"promptfil (standard {PROMPT_FILE})")
+    parser.add_argument("--resume", action="store_true", help="fortsätt från befintlig statusfil")
+    runs.add_run_args(parser, allow_new=True)
+    args = parser.parse_args()
+
+    try:
+        run = runs.resolve_run(args, create=True)
+    except ValueError as e:
+        print(f"🚫 {e}")
+        sys.exit(1)
+    if run:
+        # Egen namnrymd: logg, status, arkiv och trace i runs/<run_id>/
+        LOG_FILE = run["log"]
+        TRACE_DIR = os.path.join(run["dir"], "trace")
+
+    init_log(reset=not args.resume)
+    ensure_directories()
+    if TRACER.enabled:
+        # atexit så att trace sparas oavsett hur körningen avslutas
+        atexit.register(save_trace)
+
+    if not run:
+        sys.exit(run_create(prompt_file=args.prompt or PROMPT_FILE, resume=args.resume))
+
+    src = args.prompt or PROMPT_FILE
+    if args.prompt or not os.path.isfile(run["prompt"]):
+        if not os.path.isfile(src):
+            log(f"🚫 Hittar inte {src}. Skapa filen och försök igen.")
+            sys.exit(1)
+        shutil.copy2(src, run["prompt"])
+    log(f"• Run-id: {run['id']}  ({run['dir']})")
+    print(f"RUN_ID={run['id']}")
+    sys.exit(run_create(run["prompt"], run["status"], archive_dir=run["dir"],
+                        resume=args.resume, batch_id=run["id"]))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+deadlines.py — Tidsbudget per jobb, delas av create_songs.py och poll_songs.py.
+
+Deadline lagras som ISO-tid (UTC) i item["deadline_at"]. Saknas den gäller ingen budget.
+Timeouts och väntetider kapas till återstående tid så att ett jobb aldrig överskrider sin budget.
+"""
+
+import datetime
+
+class DeadlineExceeded(Exception):
+    pass
+
+def deadline_from_now(seconds):
+    """Returnerar deadline som ISO-tid (UTC), eller None om ingen budget satts."""
+    if not seconds or seconds <= 0:
+        return None
+    t = datetime.datetime.utcnow() + datetime.timedelta(seconds=seconds)
+    return t.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def remaining_sec(item):
+    """Sekunder kvar till jobbets deadline, eller None om ingen deadline finns."""
+    dl = item.get("deadline_at")
+    if not dl:
+        return None
+    try:
+        t = datetime.datetime.strptime(dl, "%Y-%m-%dT%H:%M:%SZ")
+    except ValueError:
+        return None
+    return (t - datetime.datetime.utcnow()).total_seconds()
+
+def deadline_passed(item):
+    rem = remaining_sec(item)
+    return rem is not None and rem <= 0
+
+def request_timeout(item, connect_timeout, read_timeout):
+    """(connect, read)-tuple för requests, kapad till återstående deadline."""
+    connect, read = connect_timeout, read_timeout
+    rem = remaining_sec(item)
+    if rem is not None:
+        rem = max(rem, 0.1)
+        connect, read = min(connect, rem), min(read, rem)
+    return (connect, read)
+
+def capped_sleep(item, seconds, stop):
+    """Sov (avbrytbart via threading.Event stop), men aldrig längre än jobbets återstående deadline."""
+    rem = remaining_sec(item)
+    if rem is not None:
+        seconds = min(seconds, max(rem, 0.0))
+    if seconds > 0:
+        stop.wait(seconds)
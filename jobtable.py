@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+jobtable.py — Kompakt jobbtabell för stora batcher (delas av create_songs.py och poll_songs.py).
+
+Varje variant lagras som en JobItem med __slots__ i stället för en dict med ~14 nycklar.
+Status och fas lagras som små heltalskoder (CodeTable), strängvärden interneras så att
+titel/prompt/tidsstämplar delas mellan varianter. JSON-formen i statusfilen är oförändrad:
+{"meta": {...}, "items": [{...}, ...]} och byggs först när tabellen sparas.
+
+Ingen JSON-text cachas per item (det skulle äta upp minnesvinsten efter första dump()).
+dumps() kodar i stället om hela tabellen. Skalära värden kodas direkt (json:s C-kodare för
+strängar) i stället för via json:s Python-kodare för indent, så det går ungefär lika fort
+som json.dump(indent=2) på vanliga dicts trots att items först byggs om till dicts.
+
+En hel dump tar ~1 s vid 100k varianter, så skripten skriver inte vid varje ändring:
+checkpoint_due() släpper igenom en dump högst var min_interval:e sekund (och aldrig oftare
+än att dumpandet tar ~10 % av tiden). Det som inte får gå förlorat mellan två dumpar
+(skapade job_id = betalda renderingar) skrivs till en append-only journal
+(<statusfil>.journal, en JSON-rad per item) som load() spelar upp och dump() tömmer.
+"""
+
+import os, sys, json, time, threading
+
+# Fält i statusfilens items, i den ordning de skrivs ut
+FIELDS = (
+    "index", "variant", "title", "prompt_text", "grid", "job_id", "phase", "status",
+    "http_status", "error_code", "error_expl", "retries", "next_retry_at",
+    "deadline_at", "last_update",
+    # Tidsmätningar (sätts bara när de finns; används av plan_batch.py)
+    "queued_at", "create_sec", "render_sec", "download_sec", "download_bytes",
+)
+
+STATUSES = (
+    "CREATING", "QUEUED", "CREATE_FAILED", "ON_HOLD_CREDITS",
+    "RETRYING_RATE", "RETRYING_MAINT", "RETRYING_SERVER",
+    "POLLING", "POLL_FAILED", "DONE", "TIMED_OUT",
+)
+
+PHASES = ("CREATE", "POLL")
+
+# ---------- Kodtabell ----------
+
+class CodeTable:
+    """
+    Mappar strängar <-> små heltal. Okända namn läggs till vid behov,
+    så statusar som inte finns i listan ovan fungerar ändå.
+    """
+
+    def __init__(self, names):
+        self._names = list(names)
+        self._codes = {n: i for i, n in enumerate(self._names)}
+        self._lock = threading.Lock()
+
+    def code(self, name):
+        if name is None:
+            return None
+        c = self._codes.get(name)
+        if c is None:
+            with self._lock:
+                c = self._codes.get(name)
+                if c is None:
+                    c = len(self._names)
+                    self._names.append(sys.intern(name))
+                    self._codes[name] = c
+        return c
+
+    def name(self, code):
+        return None if code is None else self._names[code]
+
+STATUS_CODES = CodeTable(STATUSES)
+PHASE_CODES  = CodeTable(PHASES)
+
+_CODED = {"status": STATUS_CODES, "phase": PHASE_CODES}
+_SLOT  = {f: ("_" + f if f in _CODED else f) for f in FIELDS}
+
+# json.dumps(..., indent=2) skapar en ny encoder per anrop; återanvänd en.
+# Med indent används json:s långsamma Python-kodare, så skalärer kodas direkt i _scalar().
+_ENCODER = json.JSONEncoder(indent=2)
+_STR     = json.encoder.encode_basestring_ascii     # C-implementationen när den finns
+_CONST   = {None: "null", True: "true", False: "false"}
+
+def _scalar(v):
+    """Samma text som json.dumps(v) för skalärer; listor/dicts/övrigt via _ENCODER."""
+    t = type(v)
+    if t is str:
+        return _STR(v)
+    if t is int:
+        return int.__repr__(v)
+    if v is None or t is bool:
+        return _CONST[v]
+    if t is float and v == v and v not in (float("inf"), float("-inf")):
+        return float.__repr__(v)
+    return _indent(_ENCODER.encode(v), "      ")
+
+_ITEM_PAD = "\n      "
+
+def _intern(v):
+    return sys.intern(v) if type(v) is str else v
+
+def _indent(text, pad):
+    """Indentera en json.dumps(indent=2)-text så att den passar inbäddad på nivå pad."""
+    return text.replace("\n", "\n" + pad)
+
+# ---------- Post ----------
+
+class JobItem:
+    """
+    En rad i jobbtabellen. Beter sig som en dict för de nycklar skripten använder:
+    item["status"], item.get("job_id"), "deadline_at" in item, item["x"] = v.
+    Nycklar utanför FIELDS sparas i en liten extra-dict.
+    """
+
+    __slots__ = tuple(_SLOT.values()) + ("_extra",)
+
+    def __init__(self, fields=None):
+        self._extra = None
+        if fields:
+            for k, v in fields.items():
+                self[k] = v
+
+    def __getitem__(self, key):
+        slot = _SLOT.get(key)
+        if slot is None:
+            if self._extra is None or key not in self._extra:
+                raise KeyError(key)
+            return self._extra[key]
+        try:
+            v = getattr(self, slot)
+        except AttributeError:
+            raise KeyError(key) from None
+        codes = _CODED.get(key)
+        return codes.name(v) if codes else v
+
+    def __setitem__(self, key, value):
+        slot = _SLOT.get(key)
+        if slot is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = _intern(value)
+            return
+        codes = _CODED.get(key)
+        setattr(self, slot, codes.code(value) if codes else _intern(value))
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return default
+
+    def to_dict(self):
+        out = {}
+        for f in FIELDS:
+            try:
+                v = getattr(self, _SLOT[f])
+            except AttributeError:
+                continue
+            codes = _CODED.get(f)
+            out[f] = codes.name(v) if codes else v
+        if self._extra:
+            out.update(self._extra)
+        return out
+
+    def to_json_text(self):
+        """Item som JSON-text, identisk med json.dumps(indent=2) inbäddad i items-listan."""
+        parts = [_STR(k) + ": " + _scalar(v) for k, v in self.to_dict().items()]
+        if not parts:
+            return "{}"
+        return "{" + _ITEM_PAD + ("," + _ITEM_PAD).join(parts) + "\n    }"
+
+    def __repr__(self):
+        return f"JobItem({self.to_dict()!r})"
+
+# ---------- Tabell ----------
+
+class JobTable:
+    """Statusstrukturen: meta-dict + lista av JobItem, knuten till sin statusfil (path)."""
+
+    # Dumpandet får ta högst ungefär 1/DUMP_BUDGET_FACTOR av tiden
+    DUMP_BUDGET_FACTOR = 10
+
+    def __init__(self, meta=None, path=None):
+        self.meta = meta if meta is not None else {}
+        self.items = []
+        self.path = path
+        self._last_dump = None      # time.monotonic() vid senaste dump till path
+        self._dump_sec = 0.0        # hur lång tid den tog
+
+    def add(self, fields):
+        item = JobItem(fields)
+        self.items.append(item)
+        return item
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    @classmethod
+    def from_json(cls, data, path=None):
+        table = cls(dict(data.get("meta") or {}), path)
+        for d in data.get("items") or []:
+            table.add(d)
+        return table
+
+    @classmethod
+    def load(cls, path):
+        """Läs statusfilen och spela upp journalen (ändringar efter senaste dump)."""
+        with open(path, "r", encoding="utf-8") as f:
+            table = cls.from_json(json.load(f), path)
+        table._replay_journal()
+        return table
+
+    # ----- journal -----
+
+    def _journal_path(self):
+        return self.path + ".journal"
+
+    def journal(self, item):
+        """Skriv itemets nuvarande läge till journalen direkt (O(1), oberoende av tabellens storlek)."""
+        line = json.dumps(item.to_dict(), ensure_ascii=False) + "\n"
+        with open(self._journal_path(), "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def _replay_journal(self):
+        try:
+            with open(self._journal_path(), "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        by_key = {(it.get("index"), it.get("variant")): it for it in self.items}
+        for line in lines:
+            try:
+                fields = json.loads(line)
+            except ValueError:
+                continue    # halvskriven sista rad (avbrott) ignoreras
+            it = by_key.get((fields.get("index"), fields.get("variant")))
+            if it is None:
+                by_key[(fields.get("index"), fields.get("variant"))] = self.add(fields)
+            else:
+                for k, v in fields.items():
+                    it[k] = v
+
+    def to_json(self):
+        """Samma form som statusfilen: {"meta": ..., "items": [dict, ...]}."""
+        return {"meta": self.meta, "items": [it.to_dict() for it in self.items]}
+
+    def dumps(self):
+        """
+        Serialisera till samma text som json.dump(self.to_json(), indent=2),
+        men snabbare (se to_json_text).
+        """
+        meta = _indent(_ENCODER.encode(self.meta), "  ")
+        if not self.items:
+            return '{\n  "meta": ' + meta + ',\n  "items": []\n}'
+        items = ",\n    ".join(it.to_json_text() for it in self.items)
+        return '{\n  "meta": ' + meta + ',\n  "items": [\n    ' + items + '\n  ]\n}'
+
+    def dump(self, path=None):
+        """
+        Skriv till path, eller till statusfilen tabellen lästes från/skapades för.
+        Skrivs till en .tmp-fil som sedan ersätter statusfilen, så att ett avbrott mitt i
+        skrivningen aldrig lämnar en halv fil (statusfilen är checkpoint för resume).
+        """
+        own = path is None or path == self.path
+        path = path or self.path
+        t0 = time.perf_counter()
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.dumps())
+        os.replace(tmp, path)
+        if own:
+            # Allt i journalen finns nu i statusfilen
+            try:
+                os.remove(self._journal_path())
+            except FileNotFoundError:
+                pass
+            self._last_dump = time.monotonic()
+            self._dump_sec = time.perf_counter() - t0
+
+    def checkpoint_due(self, min_interval):
+        """True om det är dags för en ny dump (se modulens docstring)."""
+        if self._last_dump is None:
+            return True
+        interval = max(min_interval, self._dump_sec * self.DUMP_BUDGET_FACTOR)
+        return time.monotonic() - self._last_dump >= interval
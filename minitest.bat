@@ -12,16 +12,20 @@ cd /d "%MINIDIR%"
 echo === Skapar .env med hårdkodade värden ===
 > ".env" echo SUNO_API=https://api.suno.example/v1
 >> ".env" echo SUNO_API_KEY=c10f2086b410e1bfb4db5d1bb3136dcf
+>> ".env" echo TIMEOUT_CONNECT=10
 >> ".env" echo TIMEOUT_CREATE=30
 >> ".env" echo TIMEOUT_POLL=30
 >> ".env" echo TIMEOUT_DOWNLOAD=180
+>> ".env" echo JOB_DEADLINE_SEC=1800
 >> ".env" echo SUNO_CALLBACK_URL=https://example.com/callback
 
 set "SUNO_API=https://api.suno.example/v1"
 set "SUNO_API_KEY=c10f2086b410e1bfb4db5d1bb3136dcf"
+set "TIMEOUT_CONNECT=10"
 set "TIMEOUT_CREATE=30"
 set "TIMEOUT_POLL=30"
 set "TIMEOUT_DOWNLOAD=180"
+set "JOB_DEADLINE_SEC=1800"
 set "SUNO_CALLBACK_URL=https://example.com/callback"
 
 echo === Skriver testprompt: sunoprompt_aktiv.json ===
@@ -48,6 +52,30 @@ if not exist "poll_songs.py" (
   echo Hämtar poll_songs.py
   powershell -NoProfile -Command "Invoke-WebRequest '%RAWBASE%/poll_songs.py' -OutFile 'poll_songs.py'"
 )
+if not exist "jobtable.py" (
+  echo Hämtar jobtable.py
+  powershell -NoProfile -Command "Invoke-WebRequest '%RAWBASE%/jobtable.py' -OutFile 'jobtable.py'"
+)
+if not exist "tracing.py" (
+  echo Hämtar tracing.py
+  powershell -NoProfile -Command "Invoke-WebRequest '%RAWBASE%/tracing.py' -OutFile 'tracing.py'"
+)
+if not exist "storage.py" (
+  echo Hämtar storage.py
+  powershell -NoProfile -Command "Invoke-WebRequest '%RAWBASE%/storage.py' -OutFile 'storage.py'"
+)
+if not exist "runs.py" (
+  echo Hämtar runs.py
+  powershell -NoProfile -Command "Invoke-WebRequest '%RAWBASE%/runs.py' -OutFile 'runs.py'"
+)
+if not exist "apirecorder.py" (
+  echo Hämtar apirecorder.py
+  powershell -NoProfile -Command "Invoke-WebRequest '%RAWBASE%/apirecorder.py' -OutFile 'apirecorder.py'"
+)
+if not exist "deadlines.py" (
+  echo Hämtar deadlines.py
+  powershell -NoProfile -Command "Invoke-WebRequest '%RAWBASE%/deadlines.py' -OutFile 'deadlines.py'"
+)
 
 echo.
 echo === KÖR: create_songs.py ===
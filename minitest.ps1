@@ -16,17 +16,21 @@ Write-Host "=== Skapar .env med hårdkodade värden ==="
 @"
 SUNO_API=https://api.suno.example/v1
 SUNO_API_KEY=c10f2086b410e1bfb4db5d1bb3136dcf
+TIMEOUT_CONNECT=10
 TIMEOUT_CREATE=30
 TIMEOUT_POLL=30
 TIMEOUT_DOWNLOAD=180
+JOB_DEADLINE_SEC=1800
 SUNO_CALLBACK_URL=https://example.com/callback
 "@ | Set-Content -LiteralPath ".env" -Encoding UTF8
 
 $env:SUNO_API          = 'https://api.suno.example/v1'
 $env:SUNO_API_KEY      = 'c10f2086b410e1bfb4db5d1bb3136dcf'
+$env:TIMEOUT_CONNECT   = '10'
 $env:TIMEOUT_CREATE    = '30'
 $env:TIMEOUT_POLL      = '30'
 $env:TIMEOUT_DOWNLOAD  = '180'
+$env:JOB_DEADLINE_SEC  = '1800'
 $env:SUNO_CALLBACK_URL = 'https://example.com/callback'
 
 Write-Host "=== Skriver testprompt: sunoprompt_aktiv.json ==="
@@ -53,6 +57,12 @@ function Ensure-File($Name) {
 
 Ensure-File -Name 'create_songs.py'
 Ensure-File -Name 'poll_songs.py'
+Ensure-File -Name 'jobtable.py'
+Ensure-File -Name 'tracing.py'
+Ensure-File -Name 'storage.py'
+Ensure-File -Name 'runs.py'
+Ensure-File -Name 'apirecorder.py'
+Ensure-File -Name 'deadlines.py'
 
 Write-Host "`n=== KÖR: create_songs.py ==="
 $process = Start-Process -FilePath "python" -ArgumentList "create_songs.py" -NoNewWindow -PassThru -Wait
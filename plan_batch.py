@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+plan_batch.py — Kapacitetsplanering: förutsäg tid och kostnad för en promptfil.
+
+Lär sig av historiken som redan finns på disk:
+  * arkiverade statusfiler (jobid_*.json, runs/*/status.json, daemon/batches/*/status.json)
+    med create_sec / render_sec / download_sec / download_bytes per jobb
+  * loggar (log.txt) för andelen 429/455/5xx vid create och poll
+  * trace-filer (TRACE=1) för exakta request-tider
+Simulerar sedan pipelinen (create -> poll -> nedladdning) med C parallella körningar
+som delar API:ts rate limit, och rekommenderar en samtidighet.
+
+  python plan_batch.py sunoprompt_aktiv.json [--concurrency 1,2,4,8] [--sims 200]
+
+Saknas historik används försiktiga standardvärden (det skrivs ut tydligt).
+"""
+
+import os, sys, json, glob, re, random, heapq, argparse, datetime, collections
+
+import create_songs
+
+STATUS_GLOBS = ["jobid_*.json", "runs/*/status.json", "runs/*/jobid_*.json",
+                "daemon/batches/*/status.json", "daemon/batches/*/jobid_*.json"]
+LOG_GLOBS    = ["log.txt", "runs/*/log.txt", "daemon/batches/*/log.txt"]
+TRACE_GLOBS  = ["trace/*.json", "runs/*/trace/*.json"]
+
+# Standardvärden om historik saknas (sekunder / byte)
+DEFAULTS = {
+    "create_sec":     [1.5],
+    "poll_sec":       [0.5],
+    "render_sec":     [90.0],
+    "download_bytes": [4_000_000],
+}
+DEFAULT_THROUGHPUT = 2_000_000      # byte/s
+DEFAULT_ERR_RATE   = 0.05
+
+POLL_INTERVAL_SEC = 2.0             # samma väntan som poll_songs.py mellan "running"-svar
+
+CREDITS_PER_JOB  = float(os.getenv("CREDITS_PER_JOB", "12"))
+API_RATE_LIMIT   = int(os.getenv("API_RATE_LIMIT", "20"))          # requests per fönster
+API_RATE_WINDOW  = float(os.getenv("API_RATE_WINDOW_SEC", "10"))
+
+FAILED_STATES = ("CREATE_FAILED", "ON_HOLD_CREDITS", "POLL_FAILED", "TIMED_OUT")
+
+LOG_RE     = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ) - (.*)$")
+RETRY_RE   = re.compile(r"RETRYING_(RATE|MAINT|SERVER) \(HTTP (\d+)\)")
+
+# ---------- Historik ----------
+
+class History:
+    def __init__(self):
+        self.samples = collections.defaultdict(list)   # create_sec, poll_sec, render_sec, ...
+        self.create_requests = 0
+        self.create_errors = 0
+        self.poll_requests = 0
+        self.poll_errors = 0
+        self.jobs_total = 0
+        self.jobs_ok = 0
+        self.sources = collections.Counter()
+
+    def sample(self, key):
+        return self.samples.get(key) or DEFAULTS.get(key)
+
+    def throughput(self):
+        b, s = self.samples.get("download_bytes"), self.samples.get("download_sec")
+        if b and s and sum(s) > 0:
+            return sum(b) / sum(s)
+        return DEFAULT_THROUGHPUT
+
+    def create_err_rate(self):
+        return self.create_errors / self.create_requests if self.create_requests else DEFAULT_ERR_RATE
+
+    def poll_err_rate(self):
+        return self.poll_errors / self.poll_requests if self.poll_requests else DEFAULT_ERR_RATE
+
+    def success_rate(self):
+        return self.jobs_ok / self.jobs_total if self.jobs_total else 1.0
+
+def _files(patterns):
+    seen = set()
+    for pat in patterns:
+        for p in sorted(glob.glob(pat)):
+            if p not in seen:
+                seen.add(p)
+                yield p
+
+def mine_status(hist):
+    """Senaste kända läget per jobb (create- och poll-arkiv innehåller samma jobb)."""
+    jobs = {}
+    for path in _files(STATUS_GLOBS):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            continue
+        hist.sources["status"] += 1
+        created = data.get("meta", {}).get("created_at")
+        for itm in data.get("items", []):
+            key = itm.get("job_id") or (created, itm.get("index"), itm.get("variant"))
+            old = jobs.get(key)
+            # Föredra posten som kommit längst (flest fält / slutstatus)
+            if old is None or len(itm) > len(old) or itm.get("status") == "DONE":
+                jobs[key] = itm
+    for itm in jobs.values():
+        st = itm.get("status")
+        if st == "DONE" or st in FAILED_STATES:
+            hist.jobs_total += 1
+            hist.jobs_ok += st == "DONE"
+        for k in ("create_sec", "render_sec", "download_sec", "download_bytes"):
+            v = itm.get(k)
+            if isinstance(v, (int, float)) and v >= 0:
+                hist.samples[k].append(v)
+
+def mine_logs(hist):
+    """Räknar requests och 429/455/5xx per fas ur loggarna (1 s upplösning)."""
+    for path in _files(LOG_GLOBS):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except Exception:
+            continue
+        hist.sources["log"] += 1
+        phase = None
+        for line in lines:
+            m = LOG_RE.match(line.rstrip("\n"))
+            if not m:
+                continue
+            msg = m.group(2)
+            if "create_songs.py start" in msg:
+                phase = "create"
+            elif "poll_songs.py start" in msg:
+                phase = "poll"
+            elif phase == "create" and "Skickar create" in msg:
+                hist.create_requests += 1
+            elif phase == "poll" and msg.startswith("• Status:"):
+                hist.poll_requests += 1
+            retry = RETRY_RE.search(msg)
+            if retry and phase == "create":
+                hist.create_errors += 1
+            elif retry and phase == "poll":
+                hist.poll_errors += 1
+                hist.poll_requests += 1
+
+def mine_traces(hist):
+    """Exakta request-tider ur trace-filer (ersätter grövre loggvärden för poll-latens)."""
+    for path in _files(TRACE_GLOBS):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                events = json.load(f).get("traceEvents", [])
+        except Exception:
+            continue
+        hist.sources["trace"] += 1
+        for ev in events:
+            if ev.get("ph") != "X":
+                continue
+            if ev.get("name") == "GET record-info" and ev.get("args", {}).get("http_status") == 200:
+                hist.samples["poll_sec"].append(ev["dur"] / 1e6)
+
+def load_history():
+    hist = History()
+    mine_status(hist)
+    mine_logs(hist)
+    mine_traces(hist)
+    return hist
+
+# ---------- Simulering ----------
+
+class RateWindow:
+    """Glidande fönster: högst `rate` godkända requests per `window` sekunder, annars 429."""
+
+    def __init__(self, rate, window):
+        self.rate, self.window = rate, window
+        self.times = collections.deque()
+
+    def allow(self, t):
+        while self.times and self.times[0] <= t - self.window:
+            self.times.popleft()
+        if len(self.times) < self.rate:
+            self.times.append(t)
+            return True
+        return False
+
+def _backoff(attempt):
+    return min(create_songs.BACKOFF_CAP_SEC, create_songs.BACKOFF_BASE_SEC * (2 ** (attempt - 1))) \
+        + random.uniform(0, create_songs.JITTER_SEC)
+
+def simulate(hist, n_jobs, lanes, rate, window, deadline):
+    """
+    En körning av pipelinen med `lanes` parallella körningar (var och en create -> poll,
+    sekventiellt som i create_songs.py/poll_songs.py). Returnerar (total tid, antal skapade,
+    antal 429 från rate limit, antal TIMED_OUT).
+    """
+    per_lane = [n_jobs // lanes + (1 if i < n_jobs % lanes else 0) for i in range(lanes)]
+    limiter = RateWindow(rate, window)
+    p_create_err, p_poll_err = hist.create_err_rate(), hist.poll_err_rate()
+    create_s, poll_s = hist.sample("create_sec"), hist.sample("poll_sec")
+    render_s, bytes_s = hist.sample("render_sec"), hist.sample("download_bytes")
+    throughput = hist.throughput()
+
+    state = []
+    heap = []
+    for i, n in enumerate(per_lane):
+        state.append({"n": n, "phase": "create", "i": 0, "attempt": 1,
+                      "created": [], "ready": [], "polls": 0, "end": 0.0})
+        if n:
+            heapq.heappush(heap, (0.0, i))
+    created = throttled = timed_out = 0
+
+    while heap:
+        t, li = heapq.heappop(heap)
+        s = state[li]
+        ok = limiter.allow(t) if s["phase"] in ("create", "poll") else True
+        if not ok:
+            throttled += 1
+
+        if s["phase"] == "create":
+            lat = random.choice(create_s)
+            if not ok or random.random() < p_create_err:
+                if s["attempt"] < create_songs.MAX_RETRIES_CREATE:
+                    s["attempt"] += 1
+                    heapq.heappush(heap, (t + lat + _backoff(s["attempt"] - 1), li))
+                    continue
+                # max försök -> jobbet misslyckas, nästa
+            else:
+                s["created"].append(t + lat)
+                s["ready"].append(t + lat + random.choice(render_s))
+                created += 1
+            s["i"] += 1
+            s["attempt"] = 1
+            if s["i"] >= s["n"]:
+                s["phase"], s["i"] = "poll", 0
+            if s["phase"] == "poll" and not s["created"]:
+                s["end"] = t + lat
+                continue
+            heapq.heappush(heap, (t + lat, li))
+            continue
+
+        # poll-fas
+        j = s["i"]
+        lat = random.choice(poll_s)
+        if s["polls"] == 0:
+            s["poll_t0"] = t        # poll_songs.py startar jobbets budget när pollingen börjar
+        s["polls"] += 1
+        done_t = None
+        if deadline and s["polls"] > 1 and t - s["poll_t0"] > deadline:
+            timed_out += 1
+            done_t = t
+        elif not ok or random.random() < p_poll_err:
+            heapq.heappush(heap, (t + lat + _backoff(s["polls"]), li))
+            continue
+        elif t + lat >= s["ready"][j]:
+            done_t = t + lat + random.choice(bytes_s) / throughput
+        else:
+            heapq.heappush(heap, (t + lat + POLL_INTERVAL_SEC, li))
+            continue
+        s["i"] += 1
+        s["polls"] = 0
+        if s["i"] >= len(s["created"]):
+            s["end"] = done_t
+        else:
+            heapq.heappush(heap, (done_t, li))
+
+    makespan = max((s["end"] for s in state), default=0.0)
+    return makespan, created, throttled, timed_out
+
+def _pct(values, p):
+    v = sorted(values)
+    return v[min(len(v) - 1, int(round(p / 100 * (len(v) - 1))))] if v else 0.0
+
+def _fmt(sec):
+    return str(datetime.timedelta(seconds=int(round(sec))))
+
+# ---------- Körning ----------
+
+def main():
+    parser = argparse.ArgumentParser(description="Förutsäg tid och kostnad för en promptfil.")
+    parser.add_argument("prompt", nargs="?", default=create_songs.PROMPT_FILE)
+    parser.add_argument("--concurrency", default="1,2,4,8,16",
+                        help="parallella körningar att jämföra (kommaseparerat)")
+    parser.add_argument("--sims", type=int, default=200, help="Monte Carlo-körningar per nivå")
+    parser.add_argument("--credits-per-job", type=float, default=CREDITS_PER_JOB)
+    parser.add_argument("--rate", type=int, default=API_RATE_LIMIT, help="API rate limit (requests per fönster)")
+    parser.add_argument("--window", type=float, default=API_RATE_WINDOW, help="rate limit-fönster i sekunder")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        with open(args.prompt, "r", encoding="utf-8") as f:
+            prompt_data = json.load(f)
+    except Exception as e:
+        print(f"🚫 Kunde inte läsa {args.prompt}: {e}")
+        sys.exit(1)
+    n_jobs = create_songs.count_jobs(prompt_data)
+    try:
+        levels = sorted({max(1, int(c)) for c in args.concurrency.split(",") if c.strip()})
+    except ValueError:
+        levels = []
+    if not levels:
+        parser.error(f"--concurrency måste vara en kommaseparerad lista med heltal, t.ex. 1,2,4 (fick '{args.concurrency}')")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    hist = load_history()
+    print(f"=== plan_batch.py: {args.prompt} – {n_jobs} renderingar ===")
+    print(f"Historik: {hist.sources['status']} statusfiler, {hist.sources['log']} loggar, "
+          f"{hist.sources['trace']} trace-filer, {hist.jobs_total} avslutade jobb")
+    for key, label in (("create_sec", "create-latens"), ("render_sec", "renderingstid"),
+                       ("poll_sec", "poll-latens"), ("download_bytes", "filstorlek")):
+        vals = hist.samples.get(key)
+        if vals:
+            print(f"  {label:15s} p50 {_pct(vals, 50):10.1f}  p90 {_pct(vals, 90):10.1f}  (n={len(vals)})")
+        else:
+            print(f"  {label:15s} ingen historik – standard {DEFAULTS[key][0]}")
+    print(f"  nedladdning     {hist.throughput() / 1e6:.2f} MB/s")
+    print(f"  fel vid create  {hist.create_err_rate():.1%}   fel vid poll {hist.poll_err_rate():.1%}"
+          f"   lyckade jobb {hist.success_rate():.1%}")
+    print(f"  rate limit      {args.rate} requests / {args.window:g} s")
+    if not hist.jobs_total:
+        print("⚠️  Ingen historik hittad – prognosen bygger på standardvärden. Kör en liten batch först.")
+    print()
+
+    deadline = create_songs.JOB_DEADLINE_SEC
+    rows = []
+    print(f"{'samtidighet':>11}  {'p50':>9}  {'p90':>9}  {'429/batch':>9}  {'förlorade':>9}  {'TIMED_OUT':>9}  {'krediter':>9}")
+    for c in levels:
+        results = [simulate(hist, n_jobs, c, args.rate, args.window, deadline) for _ in range(args.sims)]
+        spans = [r[0] for r in results]
+        created = sum(r[1] for r in results) / len(results)
+        throttled = sum(r[2] for r in results) / len(results)
+        timeouts = sum(r[3] for r in results) / len(results)
+        lost = n_jobs - created     # create gav upp efter MAX_RETRIES_CREATE
+        # Krediter dras per skapat jobb
+        credits = created * args.credits_per_job
+        rows.append((c, _pct(spans, 50), _pct(spans, 90), lost))
+        print(f"{c:>11}  {_fmt(_pct(spans, 50)):>9}  {_fmt(_pct(spans, 90)):>9}  "
+              f"{throttled:>9.1f}  {lost:>9.1f}  {timeouts:>9.1f}  {credits:>9.0f}")
+
+    # Nivåer som tappar märkbart fler jobb p.g.a. 429-stormar räknas inte (tappat jobb = omkörning)
+    fewest_lost = min(r[3] for r in rows)
+    ok_rows = [r for r in rows if r[3] <= fewest_lost + max(0.5, 0.01 * n_jobs)]
+    best = min(r[1] for r in ok_rows)
+    # Minsta samtidighet som ligger inom 5 % av bästa medianen
+    rec = next(r for r in ok_rows if r[1] <= best * 1.05)
+    print()
+    print(f"✓ Rekommendation: {rec[0]} parallella körningar (~{n_jobs // rec[0]} jobb per körning), "
+          f"beräknad tid {_fmt(rec[1])} (p90 {_fmt(rec[2])}).")
+    if rec[0] > 1:
+        print("  Dela promptfilen och starta varje del med: python create_songs.py --new-run --prompt <del>.json")
+
+if __name__ == "__main__":
+    main()
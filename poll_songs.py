@@ -3,10 +3,17 @@
 """
 poll_songs.py — Robust Suno poll med 503-hantering, loggning och tydlig status.
 Windows-fokus. Kräver: requests (pip install requests), .env med SUNO_API_KEY.
+Kan även importeras: run_poll() används av suno_daemon.py.
 """
 
-import os, sys, json, time, datetime, random
-import requests
+import os, sys, json, time, datetime, random, atexit, shutil, threading, hashlib, argparse
+
+from jobtable import JobTable
+from tracing import Tracer
+from deadlines import DeadlineExceeded, deadline_from_now, deadline_passed, request_timeout, capped_sleep
+from storage import Storage
+import runs
+import apirecorder
 
 # ---------- Konfiguration & .env ----------
 
@@ -33,33 +40,77 @@ load_env_envfile()
 SUNO_API_BASE = os.getenv("SUNO_API", "https://api.sunoapi.org").rstrip("/")
 SUNO_API_POLL = f"{SUNO_API_BASE}/api/v1/generate/record-info?taskId={{job_id}}"
 
-TIMEOUT_POLL     = int(os.getenv("TIMEOUT_POLL", "30"))
-TIMEOUT_DOWNLOAD = int(os.getenv("TIMEOUT_DOWNLOAD", "180"))
+# Timeouts: separat connect- och läs-timeout per request (sekunder)
+TIMEOUT_CONNECT  = float(os.getenv("TIMEOUT_CONNECT",  "10"))
+TIMEOUT_POLL     = float(os.getenv("TIMEOUT_POLL",     "30"))
+TIMEOUT_DOWNLOAD = float(os.getenv("TIMEOUT_DOWNLOAD", "180"))
+
+# Tidsbudget per jobb, 0 = ingen gräns. create_songs.py sätter item["deadline_at"] för create;
+# här startas en ny budget när just det jobbets polling börjar (poll + nedladdning). Jobb
+# pollas ett i taget, så en gemensam budget från create skulle löpa ut för jobb som väntar.
+JOB_DEADLINE_SEC = float(os.getenv("JOB_DEADLINE_SEC", "3600"))
+
+# Minsta tid mellan två skrivningar av statusfilen (sekunder); fasbyten skrivs alltid
+STATUS_WRITE_SEC = float(os.getenv("STATUS_WRITE_SEC", "2"))
 
 BACKOFF_BASE_SEC = float(os.getenv("BACKOFF_BASE_SEC", "1.5"))
 BACKOFF_CAP_SEC  = float(os.getenv("BACKOFF_CAP_SEC",  "30.0"))
 JITTER_SEC       = float(os.getenv("JITTER_SEC",       "0.5"))
 MAX_RETRIES_POLL = int(os.getenv("MAX_RETRIES_POLL", "1000"))
 
+# Opt-in tracing (Chrome trace / Perfetto JSON) av poll-förloppet
+TRACE_ENABLED = os.getenv("TRACE", "0").lower() in ("1", "true", "yes", "y")
+TRACE_DIR     = os.getenv("TRACE_DIR", "trace")
+
+PROMPT_FILE = "sunoprompt_aktiv.json"
 STATUS_FILE = "jobid_aktiv.json"
 LOG_FILE    = "log.txt"
 
+TRACER = Tracer("poll_songs.py", enabled=TRACE_ENABLED)
+
+# Var MP3:or och serversvar hamnar (OUT_DIR, JOB_DIR, STORAGE_LAYOUT, STORAGE_DEDUP)
+STORAGE = Storage()
+
+# Sätts för att avbryta pågående polling (daemon vid nedstängning); sömn avbryts direkt
+STOP = threading.Event()
+
+# Items i dessa lägen är färdigpollade och hoppas över (t.ex. vid resume).
+# TIMED_OUT är inte slutgiltigt: renderingen är redan betald och kan ha blivit klar sedan dess.
+FINAL_STATES = ("DONE", "POLL_FAILED")
+
 # ---------- Logg ----------
 
 _log_initialized = False
+_log_local = threading.local()
 
 def _ts():
     return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
 
+def seconds_since(ts):
+    """Sekunder sedan en _ts()-tidsstämpel, eller None om den saknas/är ogiltig."""
+    try:
+        t = datetime.datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ")
+    except (TypeError, ValueError):
+        return None
+    return (datetime.datetime.utcnow() - t).total_seconds()
+
+def log_file():
+    """Aktuell loggfil: per tråd om set_log_file() anropats (daemon), annars LOG_FILE."""
+    return getattr(_log_local, "path", None) or LOG_FILE
+
+def set_log_file(path):
+    _log_local.path = path
+
 def init_log():
     """
     Om logg finns från create -> append.
     Om inte, skapa ny fil.
     """
     global _log_initialized
-    mode = "a" if os.path.exists(LOG_FILE) and os.path.getsize(LOG_FILE) > 0 else "w"
+    path = log_file()
+    mode = "a" if os.path.exists(path) and os.path.getsize(path) > 0 else "w"
     try:
-        with open(LOG_FILE, mode, encoding="utf-8") as lf:
+        with open(path, mode, encoding="utf-8") as lf:
             lf.write(f"{_ts()} - === poll_songs.py start ===\n")
             lf.write(f"{_ts()} - API_BASE={SUNO_API_BASE}\n")
         _log_initialized = True
@@ -73,15 +124,33 @@ def log(msg):
     try:
         if not _log_initialized:
             init_log()
-        with open(LOG_FILE, "a", encoding="utf-8") as lf:
+        with open(log_file(), "a", encoding="utf-8") as lf:
             lf.write(s + "\n")
     except Exception as e:
         print(f"⚠️  Kunde inte skriva till logg: {e}")
 
 # ---------- Hjälp ----------
 
+def save_status(job_status, force=False):
+    """
+    Statusfilen skrivs högst var STATUS_WRITE_SEC:e sekund (hela tabellen kodas om).
+    force=True vid fasbyte, stopp och fel som avbryter körningen.
+    """
+    if not force and not job_status.checkpoint_due(STATUS_WRITE_SEC):
+        return
+    with TRACER.span("status_write", cat="io"):
+        job_status.dump()
+
+def save_trace():
+    ts = datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    try:
+        path = TRACER.save(os.path.join(TRACE_DIR, f"poll_{ts}.json"))
+        log(f"✓ Trace sparad → {path}")
+    except Exception as e:
+        log(f"⚠️  Kunde inte spara trace: {e}")
+
 def ensure_directories():
-    for d in ("out", "job"):
+    for d in (STORAGE.out_dir, STORAGE.job_dir):
         if not os.path.isdir(d):
             os.makedirs(d, exist_ok=True)
 
@@ -94,37 +163,47 @@ def load_api_key():
 
 # ---------- Körning ----------
 
-def main():
-    init_log()
-    ensure_directories()
-
+def run_poll(status_file=STATUS_FILE, prompt_file=PROMPT_FILE, archive_dir=".",
+             archive=True, session=None):
+    """
+    Pollar alla skapade jobb i status_file och laddar ner färdiga MP3:or.
+    Items som redan är klara (FINAL_STATES) hoppas över, så en avbruten körning kan återupptas.
+    archive: flytta statusfilen till archive_dir och ta bort prompt_file när allt är klart.
+    session: requests.Session att återanvända (varma anslutningar), annars skapas en.
+    Returnerar 0 = klart, 1 = fel, 2 = avbruten via STOP (statusfilen är checkpoint).
+    """
     api_key = load_api_key()
     if not api_key:
         log("🚫 SUNO_API_KEY saknas. Kontrollera .env och försök igen.")
-        sys.exit(1)
+        return 1
 
-    if not os.path.isfile(STATUS_FILE):
-        log(f"🚫 Hittar inte {STATUS_FILE}. Kör create_songs.py först.")
-        sys.exit(1)
+    if not os.path.isfile(status_file):
+        log(f"🚫 Hittar inte {status_file}. Kör create_songs.py först.")
+        return 1
 
     # Läs in status
     try:
-        with open(STATUS_FILE, "r", encoding="utf-8") as f:
-            job_status = json.load(f)
+        job_status = JobTable.load(status_file)
     except Exception as e:
-        log(f"🚫 Kunde inte läsa {STATUS_FILE}: {e}")
-        sys.exit(1)
+        log(f"🚫 Kunde inte läsa {status_file}: {e}")
+        return 1
 
-    job_status.setdefault("meta", {})
-    job_status["meta"]["overall_status"] = "POLLING"
-    job_status["meta"]["note"] = "Pollar Suno efter färdiga låtar..."
-    job_status["meta"]["poll_started"] = _ts()
+    job_status.meta["overall_status"] = "POLLING"
+    job_status.meta["note"] = "Pollar Suno efter färdiga låtar..."
+    job_status.meta["poll_started"] = _ts()
 
-    for item in job_status.get("items", []):
+    for item in job_status:
+        if item.get("status") in FINAL_STATES:
+            continue
         if item.get("job_id"):
             item["phase"] = "POLL"
             if item.get("status") in ("QUEUED","CREATING"):
                 item["status"] = "POLLING"
+            elif item.get("status") == "TIMED_OUT":
+                # Tidigare körning gav upp – försök igen med ny budget
+                item["status"] = "POLLING"
+                item["error_code"] = None
+                item["error_expl"] = None
             item["retries"] = 0
             item["next_retry_at"] = None
             item["last_update"] = _ts()
@@ -132,40 +211,69 @@ def main():
             item["phase"] = "CREATE"
             item["last_update"] = _ts()
 
-    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-        json.dump(job_status, f, indent=2)
+    save_status(job_status)
 
     headers = {"Authorization": f"Bearer {api_key}"}
+    http = session if session is not None else apirecorder.make_session()
+
+    # Batch-id styr lagringslayouten; äldre statusfiler saknar det -> härled från created_at
+    batch_id = job_status.meta.get("batch_id")
+    if not batch_id:
+        created = job_status.meta.get("created_at") or _ts()
+        batch_id = created.replace("-", "").replace(":", "").replace("T", "-").rstrip("Z")
 
     log("▶ Börjar polling av jobb...")
 
-    for item in job_status.get("items", []):
+    lane_base = TRACER.lane_block()
+    for lane, item in enumerate(job_status, start=lane_base + 1):
+        if STOP.is_set():
+            break
         job_id = item.get("job_id")
-        if not job_id:
+        if not job_id or item.get("status") in FINAL_STATES:
             continue
 
         title   = item.get("title", "Untitled")
         variant = item.get("variant", 1)
         index   = item.get("index", 0)
         log(f"▶ Börjar polla {title} v{variant} ({job_id}) ...")
+        TRACER.set_lane(lane, f"{index:03d} {title} v{variant}")
+        TRACER.begin("poll", cat="item", job_id=job_id)
 
+        # Budgeten för poll + nedladdning räknas från när just detta jobb börjar pollas
+        item["deadline_at"] = deadline_from_now(JOB_DEADLINE_SEC)
         poll_attempts = 0
         start_time = time.time()
+        # Renderingstid mäts bara om jobbet sågs oklart först (annars vet vi inte när det blev klart)
+        pending_seen = False
 
         while poll_attempts < MAX_RETRIES_POLL:
+            if STOP.is_set():
+                break
+            # Minst ett försök görs alltid: är renderingen klar hämtas den oavsett budget
+            if poll_attempts > 0 and deadline_passed(item):
+                item["status"] = "TIMED_OUT"
+                item["error_code"] = "DEADLINE"
+                item["error_expl"] = f"Tidsbudget ({JOB_DEADLINE_SEC:.0f}s) slut under polling"
+                item["last_update"] = _ts()
+                save_status(job_status)
+                log(f"✗ Jobb {job_id}: TIMED_OUT – deadline passerad under polling.")
+                break
+
             poll_attempts += 1
             item["retries"] = poll_attempts
             item["last_update"] = _ts()
-            with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                json.dump(job_status, f, indent=2)
+            save_status(job_status)
 
             url = SUNO_API_POLL.format(job_id=job_id)
 
             try:
-                resp = requests.get(url, headers=headers, timeout=TIMEOUT_POLL)
+                with TRACER.span("GET record-info", cat="http", attempt=poll_attempts) as sp:
+                    resp = http.get(url, headers=headers, timeout=request_timeout(item, TIMEOUT_CONNECT, TIMEOUT_POLL))
+                    sp["http_status"] = resp.status_code
             except Exception as e:
                 # nätverksglitch -> försök igen snart
-                time.sleep(2.0)
+                with TRACER.span("backoff", cat="sleep", error=str(e)):
+                    capped_sleep(item, 2.0, STOP)
                 continue
 
             code = resp.status_code
@@ -185,8 +293,7 @@ def main():
                     item["error_code"] = inner
                     item["error_expl"] = data.get("msg") or data.get("message") or "API-rapport fel"
                     item["last_update"] = _ts()
-                    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                        json.dump(job_status, f, indent=2)
+                    save_status(job_status)
                     log(f"✗ Jobb {job_id} rapporterade API-fel: {item['error_expl']}")
                     break
 
@@ -200,6 +307,10 @@ def main():
 
                 if api_status in ("SUCCESS", "COMPLETED"):
                     log("• Status: completed")
+                    if pending_seen:
+                        render_sec = seconds_since(item.get("queued_at"))
+                        if render_sec is not None:
+                            item["render_sec"] = round(render_sec, 1)
                     # Hämta audioUrl
                     song_data_list = []
                     try:
@@ -229,43 +340,82 @@ def main():
                         item["status"] = "POLL_FAILED"
                         item["error_expl"] = "Kunde inte hitta audioUrl"
                         item["last_update"] = _ts()
-                        with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                            json.dump(job_status, f, indent=2)
+                        save_status(job_status)
                         log(f"✗ Misslyckades hämta audioUrl för {job_id}")
                         break
 
                     # Ladda ner
-                    fname = f"{index:03d}_{title.strip().replace(' ','_')}_v{variant}_{job_id}.mp3"
-                    safe = "".join([c if c.isalnum() or c in "._-" else "_" for c in fname])
-                    fpath = os.path.join("out", safe)
-                    log(f"↓ Laddar ner MP3 → {safe}")
+                    fpath = STORAGE.audio_path(item, batch_id)
+                    tmp_path = fpath + ".part"
+                    log(f"↓ Laddar ner MP3 → {os.path.basename(fpath)}")
+                    linked_from = None
                     try:
-                        rf = requests.get(audio_url, timeout=TIMEOUT_DOWNLOAD)
-                        rf.raise_for_status()
-                        with open(fpath, "wb") as f:
-                            f.write(rf.content)
+                        # Strömma till fil så att deadline kan kontrolleras under nedladdningen
+                        dl_t0 = time.perf_counter()
+                        with TRACER.span("GET audio", cat="http") as sp, \
+                             http.get(audio_url, timeout=request_timeout(item, TIMEOUT_CONNECT, TIMEOUT_DOWNLOAD), stream=True) as rf:
+                            rf.raise_for_status()
+                            nbytes, write_sec = 0, 0.0
+                            hasher = hashlib.sha256()
+                            with open(tmp_path, "wb") as f:
+                                for chunk in rf.iter_content(chunk_size=64 * 1024):
+                                    if deadline_passed(item):
+                                        raise DeadlineExceeded("deadline passerad under nedladdning")
+                                    t0 = time.perf_counter()
+                                    f.write(chunk)
+                                    write_sec += time.perf_counter() - t0
+                                    hasher.update(chunk)
+                                    nbytes += len(chunk)
+                            # Skrivningar sker mellan nätverksläsningar -> summeras i stället för egna spans
+                            sp["bytes"] = nbytes
+                            sp["file_write_ms"] = round(write_sec * 1000, 3)
+                        sha256 = hasher.hexdigest()
+                        item["download_sec"] = round(time.perf_counter() - dl_t0, 3)
+                        item["download_bytes"] = nbytes
+                        # Identiskt ljud finns redan -> hårdlänk i stället för ny kopia
+                        linked_from = STORAGE.commit_audio(tmp_path, fpath, sha256)
                     except Exception as e:
-                        item["status"] = "POLL_FAILED"
-                        item["error_code"] = "DOWNLOAD_ERR"
-                        item["error_expl"] = f"Nedladdning misslyckades: {e}"
+                        try:
+                            if os.path.isfile(tmp_path):
+                                os.remove(tmp_path)
+                        except Exception:
+                            pass
+                        if isinstance(e, DeadlineExceeded) or deadline_passed(item):
+                            item["status"] = "TIMED_OUT"
+                            item["error_code"] = "DEADLINE"
+                            item["error_expl"] = f"Tidsbudget ({JOB_DEADLINE_SEC:.0f}s) slut under nedladdning"
+                        else:
+                            item["status"] = "POLL_FAILED"
+                            item["error_code"] = "DOWNLOAD_ERR"
+                            item["error_expl"] = f"Nedladdning misslyckades: {e}"
                         item["last_update"] = _ts()
-                        with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                            json.dump(job_status, f, indent=2)
+                        save_status(job_status)
                         log(f"✗ Nedladdning misslyckades för {job_id}: {e}")
                         break
 
+                    if linked_from:
+                        log(f"• Identiskt ljud fanns redan – hårdlänkad till {linked_from}")
+
                     # Spara serverrespons
+                    json_path = STORAGE.job_json_path(job_id, batch_id)
                     try:
-                        with open(os.path.join("job", f"{job_id}.json"), "w", encoding="utf-8") as jf:
+                        with TRACER.span("job_json_write", cat="io"), \
+                             open(json_path, "w", encoding="utf-8") as jf:
                             json.dump(data, jf, indent=2)
                     except Exception as e:
+                        json_path = None
                         log(f"⚠️  Kunde inte spara serverrespons för {job_id}: {e}")
 
+                    # Manifest: job_id/titel/variant -> sökvägar
+                    try:
+                        STORAGE.record(item, batch_id, fpath, json_path, sha256, nbytes, linked_from)
+                    except Exception as e:
+                        log(f"⚠️  Kunde inte uppdatera manifest för {job_id}: {e}")
+
                     # Markera klar
                     item["status"] = "DONE"
                     item["last_update"] = _ts()
-                    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                        json.dump(job_status, f, indent=2)
+                    save_status(job_status)
                     elapsed = int(time.time() - start_time)
                     log(f"✓ Klar ({elapsed}s). Fil: {os.path.abspath(fpath)}")
                     break
@@ -274,14 +424,15 @@ def main():
                     item["status"] = "POLL_FAILED"
                     item["error_expl"] = "Jobb misslyckades i Suno API"
                     item["last_update"] = _ts()
-                    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                        json.dump(job_status, f, indent=2)
+                    save_status(job_status)
                     log(f"✗ Jobb {job_id} rapporterades misslyckat av API.")
                     break
 
                 else:
                     log("• Status: running")
-                    time.sleep(2.0)
+                    pending_seen = True
+                    with TRACER.span("poll_wait", cat="sleep", api_status=api_status):
+                        capped_sleep(item, 2.0, STOP)
                     continue
 
             elif code == 401:
@@ -289,8 +440,7 @@ def main():
                 item["error_code"] = 401
                 item["error_expl"] = "Ogiltig API-nyckel (401)"
                 item["last_update"] = _ts()
-                with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(job_status, f, indent=2)
+                save_status(job_status)
                 log(f"🚫 Jobb {job_id}: 401 Unauthorized under polling.")
                 break
 
@@ -300,10 +450,10 @@ def main():
                 item["error_code"] = 429
                 item["next_retry_at"] = _ts()
                 item["last_update"] = _ts()
-                with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(job_status, f, indent=2)
+                save_status(job_status)
                 log(f"… RETRYING_RATE (HTTP {code}) – retry om {sleep_time:.1f}s")
-                time.sleep(sleep_time)
+                with TRACER.span("backoff", cat="sleep", http_status=code, seconds=round(sleep_time, 3)):
+                    capped_sleep(item, sleep_time, STOP)
                 item["status"] = "POLLING"
                 continue
 
@@ -313,10 +463,10 @@ def main():
                 item["error_code"] = 455
                 item["next_retry_at"] = _ts()
                 item["last_update"] = _ts()
-                with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(job_status, f, indent=2)
+                save_status(job_status)
                 log(f"… RETRYING_MAINT (HTTP 455) – retry om {sleep_time:.1f}s")
-                time.sleep(sleep_time)
+                with TRACER.span("backoff", cat="sleep", http_status=code, seconds=round(sleep_time, 3)):
+                    capped_sleep(item, sleep_time, STOP)
                 item["status"] = "POLLING"
                 continue
 
@@ -326,10 +476,10 @@ def main():
                 item["error_code"] = code
                 item["next_retry_at"] = _ts()
                 item["last_update"] = _ts()
-                with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(job_status, f, indent=2)
+                save_status(job_status)
                 log(f"… RETRYING_SERVER (HTTP {code}) – retry om {sleep_time:.1f}s")
-                time.sleep(sleep_time)
+                with TRACER.span("backoff", cat="sleep", http_status=code, seconds=round(sleep_time, 3)):
+                    capped_sleep(item, sleep_time, STOP)
                 item["status"] = "POLLING"
                 continue
 
@@ -339,8 +489,7 @@ def main():
                 item["error_code"] = code
                 item["error_expl"] = txt if txt else "Polling misslyckades"
                 item["last_update"] = _ts()
-                with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(job_status, f, indent=2)
+                save_status(job_status)
                 log(f"✗ Jobb {job_id} polling misslyckades (HTTP {code}): {txt}")
                 break
 
@@ -350,40 +499,83 @@ def main():
             item["error_code"] = "MAX_RETRIES"
             item["error_expl"] = "Timeout - gav upp efter många försök"
             item["last_update"] = _ts()
-            with open(STATUS_FILE, "w", encoding="utf-8") as f:
-                json.dump(job_status, f, indent=2)
+            save_status(job_status)
             log(f"✗ Jobb {job_id}: max retries utan resultat.")
 
+        TRACER.end(status=item["status"])
+
+    if STOP.is_set():
+        job_status.meta["overall_status"] = "POLL_INTERRUPTED"
+        job_status.meta["note"] = "Avbruten - statusfilen är checkpoint, kör poll igen för att fortsätta."
+        save_status(job_status, force=True)
+        log("⏸ polling avbruten – ej klara jobb pollas vid nästa körning.")
+        return 2
+
     # Klarmarkera & arkivera
-    job_status["meta"]["overall_status"] = "DONE"
-    job_status["meta"]["note"] = "Polling klar."
-    job_status["meta"]["completed_at"] = _ts()
+    timed_out = sum(1 for itm in job_status if itm.get("status") == "TIMED_OUT")
+    job_status.meta["overall_status"] = "DONE"
+    job_status.meta["note"] = "Polling klar." if not timed_out else f"Polling klar. {timed_out} jobb överskred tidsbudgeten (TIMED_OUT)."
+    job_status.meta["completed_at"] = _ts()
 
-    with open(STATUS_FILE, "w", encoding="utf-8") as f:
-        json.dump(job_status, f, indent=2)
+    save_status(job_status, force=True)
+
+    if not archive:
+        log("=== poll_songs.py klart ===")
+        return 0
 
     ts = datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-    archive = f"jobid_{ts}.json"
+    archive_path = os.path.join(archive_dir, f"jobid_{ts}.json")
     try:
-        os.replace(STATUS_FILE, archive)
+        os.replace(status_file, archive_path)
     except Exception:
         try:
-            import shutil
-            shutil.copy2(STATUS_FILE, archive)
-            os.remove(STATUS_FILE)
+            shutil.copy2(status_file, archive_path)
+            os.remove(status_file)
         except Exception as e:
-            log(f"⚠️  Kunde inte arkivera {STATUS_FILE}: {e}")
+            log(f"⚠️  Kunde inte arkivera {status_file}: {e}")
 
     # Ta bort kvarvarande promptfil (create gör en kopia vid arkivering)
-    if os.path.isfile("sunoprompt_aktiv.json"):
+    if prompt_file and os.path.isfile(prompt_file):
         try:
-            os.remove("sunoprompt_aktiv.json")
+            os.remove(prompt_file)
         except Exception:
             pass
 
-    log(f"✓ Arkiverade job-status → {archive}")
+    log(f"✓ Arkiverade job-status → {archive_path}")
     log("✓ Städade aktiva statusfiler. Klart!")
     log("=== poll_songs.py klart ===")
+    return 0
+
+def main():
+    global LOG_FILE, TRACE_DIR, STORAGE
+    parser = argparse.ArgumentParser(description="Polla skapade Suno-jobb och ladda ner MP3:or.")
+    runs.add_run_args(parser)
+    args = parser.parse_args()
+
+    try:
+        run = runs.resolve_run(args)
+    except ValueError as e:
+        print(f"🚫 {e}")
+        sys.exit(1)
+    if run:
+        if not os.path.isdir(run["dir"]):
+            print(f"🚫 Hittar ingen körning {run['id']} i {runs.RUNS_DIR}/. Kör create_songs.py --new-run först.")
+            sys.exit(1)
+        LOG_FILE = run["log"]
+        TRACE_DIR = os.path.join(run["dir"], "trace")
+        # Körningar lagrar som standard sina MP3:or i en egen batchkatalog
+        STORAGE = Storage(layout=os.getenv("STORAGE_LAYOUT", "batch").lower())
+
+    init_log()
+    ensure_directories()
+    if TRACER.enabled:
+        atexit.register(save_trace)
+
+    if not run:
+        sys.exit(run_poll())
+    # Körningskatalogen är själva arkivet: status.json och prompt.json ligger kvar,
+    # och inga delade filer i arbetskatalogen rörs.
+    sys.exit(run_poll(run["status"], prompt_file=None, archive=False))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
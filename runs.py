@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+runs.py — Namnrymder för körningar, så att flera batcher kan köras samtidigt på samma maskin.
+
+En körning (run) har ett id och en egen katalog under RUNS_DIR:
+  runs/<run_id>/prompt.json   kopia av promptfilen
+  runs/<run_id>/status.json   jobbstatus (motsvarar jobid_aktiv.json)
+  runs/<run_id>/log.txt       logg för just denna körning
+MP3:or lagras via storage.py med batch_id = run_id.
+
+  python create_songs.py --new-run [--prompt fil.json]    -> skriver ut RUN_ID=...
+  python poll_songs.py --run-id <run_id>
+  python runs.py                                          -> lista körningar
+
+Utan --run-id/--new-run (och utan RUN_ID i miljön) används de gamla filerna i
+arbetskatalogen som tidigare.
+"""
+
+import os, json, datetime, uuid
+
+RUNS_DIR = os.getenv("RUNS_DIR", "runs")
+
+def new_run_id():
+    """Tidsstämpel + slumpdel, så att två körningar samma sekund inte krockar."""
+    return datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+def valid_run_id(run_id):
+    return bool(run_id) and all(c.isalnum() or c in "._-" for c in run_id) and run_id not in (".", "..")
+
+def run_paths(run_id, base=None):
+    d = os.path.join(base or RUNS_DIR, run_id)
+    return {
+        "id": run_id,
+        "dir": d,
+        "prompt": os.path.join(d, "prompt.json"),
+        "status": os.path.join(d, "status.json"),
+        "log": os.path.join(d, "log.txt"),
+    }
+
+def add_run_args(parser, allow_new=False):
+    parser.add_argument("--run-id", help="kör i namnrymden runs/<run_id> (annars RUN_ID från miljön)")
+    if allow_new:
+        parser.add_argument("--new-run", action="store_true", help="skapa en ny körning med nytt run-id")
+
+def resolve_run(args, create=False):
+    """Run-paths utifrån --run-id/--new-run/RUN_ID, eller None för det gamla läget."""
+    run_id = getattr(args, "run_id", None) or os.getenv("RUN_ID")
+    if getattr(args, "new_run", False):
+        run_id = new_run_id()
+    if not run_id:
+        return None
+    if not valid_run_id(run_id):
+        raise ValueError(f"Ogiltigt run-id '{run_id}' (tillåtet: bokstäver, siffror, . _ -)")
+    paths = run_paths(run_id)
+    if create:
+        os.makedirs(paths["dir"], exist_ok=True)
+    return paths
+
+# ---------- CLI ----------
+
+def main():
+    if not os.path.isdir(RUNS_DIR):
+        print(f"Inga körningar i {RUNS_DIR}/")
+        return
+    for run_id in sorted(os.listdir(RUNS_DIR)):
+        p = run_paths(run_id)
+        if not os.path.isdir(p["dir"]):
+            continue
+        overall, n = "-", 0
+        try:
+            with open(p["status"], "r", encoding="utf-8") as f:
+                data = json.load(f)
+            overall = data.get("meta", {}).get("overall_status", "-")
+            n = len(data.get("items", []))
+        except Exception:
+            pass
+        print(f"{run_id:32s} {overall:20s} {n:6d} jobb")
+
+if __name__ == "__main__":
+    main()
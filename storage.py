@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+storage.py — Lagringslayout för MP3:or och serversvar, med dedup och manifest.
+
+Layout (STORAGE_LAYOUT):
+  flat   out/<fil>.mp3                           (standard, som tidigare)
+  batch  out/<YYYY-MM-DD>/<batch_id>/<fil>.mp3   (en katalog per batch och datum)
+  hash   out/<ab>/<cd>/<fil>.mp3                 (ab/cd = sha1(job_id)-prefix, jämn spridning)
+Serversvar (job/<job_id>.json) sharddas på samma sätt under JOB_DIR.
+
+Dedup (STORAGE_DEDUP=1, av som standard): identiskt ljud (samma sha256) hårdlänkas till den
+fil som redan finns i stället för att skrivas en gång till. Faller tillbaka till vanlig fil om
+hårdlänk inte går (annan disk, FAT m.m.). Obs: hårdlänkade filer delar innehåll, så den som
+redigerar en MP3 på plats ändrar alla dubbletter.
+
+Manifest: <OUT_DIR>/manifest.jsonl, en rad per lagrad fil. Läses in till dict-index så att
+uppslag på job_id, sha256, titel eller titel/variant är O(1) inom en körande process; bara nya
+rader läses vid varje uppslag. Ett nytt Storage-objekt (t.ex. `storage.py find`) läser däremot
+hela manifestet en gång, O(antal rader).
+Flera körningar (processer) kan dela samma manifest: dedup-uppslag och tillägg görs under
+ett fillås (manifest.jsonl.lock), och rader som andra processer lagt till läses in först.
+
+  python storage.py find <job_id | titel> [variant]
+"""
+
+import os, sys, json, hashlib, datetime, threading, time, contextlib
+
+try:
+    import fcntl
+except ImportError:         # Windows
+    fcntl = None
+    import msvcrt
+
+OUT_DIR        = os.getenv("OUT_DIR", "out")
+JOB_DIR        = os.getenv("JOB_DIR", "job")
+STORAGE_LAYOUT = os.getenv("STORAGE_LAYOUT", "flat").lower()
+STORAGE_DEDUP  = os.getenv("STORAGE_DEDUP", "0").lower() in ("1", "true", "yes", "y")
+
+LAYOUTS = ("flat", "batch", "hash")
+
+def _ts():
+    return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def safe_name(name):
+    return "".join([c if c.isalnum() or c in "._-" else "_" for c in name])
+
+def audio_filename(item):
+    """Samma filnamn som poll_songs.py alltid använt: 001_Titel_v1_<job_id>.mp3"""
+    title = (item.get("title") or "Untitled").strip().replace(" ", "_")
+    return safe_name(f"{item.get('index', 0):03d}_{title}_v{item.get('variant', 1)}_{item.get('job_id')}.mp3")
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exklusivt lås mellan processer (fcntl.flock / msvcrt.locking på första byten)."""
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)    # LK_LOCK ger upp efter ~10 s, försök igen
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def batch_date(batch_id):
+    """'20261019-120000' -> '2026-10-19'; okänt format -> dagens datum."""
+    try:
+        return datetime.datetime.strptime(batch_id[:8], "%Y%m%d").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return datetime.datetime.utcnow().strftime("%Y-%m-%d")
+
+class Storage:
+    """Beräknar sökvägar enligt layout, dedupar ljud och för manifest."""
+
+    def __init__(self, out_dir=OUT_DIR, job_dir=JOB_DIR, layout=STORAGE_LAYOUT, dedup=STORAGE_DEDUP):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Okänd STORAGE_LAYOUT '{layout}' (välj {', '.join(LAYOUTS)})")
+        self.out_dir = out_dir
+        self.job_dir = job_dir
+        self.layout = layout
+        self.dedup = dedup
+        self.manifest_path = os.path.join(out_dir, "manifest.jsonl")
+        self.lock_path = self.manifest_path + ".lock"
+        self._lock = threading.Lock()
+        self._offset = 0            # så långt i manifestet som är inläst
+        self.by_job = {}
+        self.by_hash = {}
+        self.by_title = {}          # (titel, variant) -> [job_id, ...]
+        self.by_title_only = {}     # titel -> [job_id, ...]
+
+    # ----- layout -----
+
+    def _shard(self, base, job_id, batch_id):
+        if self.layout == "batch":
+            d = os.path.join(base, batch_date(batch_id), safe_name(batch_id or "unknown"))
+        elif self.layout == "hash":
+            h = hashlib.sha1(str(job_id).encode("utf-8")).hexdigest()
+            d = os.path.join(base, h[:2], h[2:4])
+        else:
+            d = base
+        os.makedirs(d, exist_ok=True)
+        return d
+
+    def audio_path(self, item, batch_id=None):
+        return os.path.join(self._shard(self.out_dir, item.get("job_id"), batch_id), audio_filename(item))
+
+    def job_json_path(self, job_id, batch_id=None):
+        return os.path.join(self._shard(self.job_dir, job_id, batch_id), f"{job_id}.json")
+
+    # ----- manifest -----
+
+    def _index(self, rec):
+        self.by_job[rec["job_id"]] = rec
+        sha = rec.get("sha256")
+        # Senast skrivna originalfil vinner (en äldre kan ha tagits bort); länkar ändrar inget
+        if sha and (sha not in self.by_hash or not rec.get("linked_from")):
+            self.by_hash[sha] = rec["path"]
+        self.by_title.setdefault((rec.get("title"), rec.get("variant")), []).append(rec["job_id"])
+        self.by_title_only.setdefault(rec.get("title"), []).append(rec["job_id"])
+
+    def _catch_up(self):
+        """Läs in rader som tillkommit sedan sist (även från andra processer). Kräver self._lock."""
+        try:
+            if os.path.getsize(self.manifest_path) <= self._offset:
+                return
+        except OSError:
+            return
+        with open(self.manifest_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1     # en halvskriven sista rad läses nästa gång
+        for line in data[:end].splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                self._index(json.loads(line.decode("utf-8")))
+            except (ValueError, KeyError):
+                continue    # trasig rad (t.ex. avbruten skrivning) ignoreras
+        self._offset += end
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Tråd- och processlås runt manifestet, med indexen uppdaterade."""
+        with self._lock:
+            os.makedirs(self.out_dir, exist_ok=True)
+            with file_lock(self.lock_path):
+                self._catch_up()
+                yield
+
+    def load(self):
+        with self._lock:
+            self._catch_up()
+
+    def record(self, item, batch_id, path, json_path=None, sha256=None, nbytes=None, linked_from=None):
+        """Lägg till en rad i manifestet (append-only) och uppdatera indexen."""
+        rec = {
+            "job_id": item.get("job_id"),
+            "title": item.get("title"),
+            "variant": item.get("variant"),
+            "index": item.get("index"),
+            "batch_id": batch_id,
+            "path": path,
+            "json_path": json_path,
+            "sha256": sha256,
+            "bytes": nbytes,
+            "linked_from": linked_from,
+            "stored_at": _ts(),
+        }
+        line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._locked():
+            with open(self.manifest_path, "ab") as f:
+                f.write(line)
+            self._offset += len(line)   # ingen annan kan ha skrivit emellan (fillåset)
+            self._index(rec)
+        return rec
+
+    def lookup(self, job_id):
+        self.load()
+        return self.by_job.get(job_id)
+
+    def find(self, title, variant=None):
+        self.load()
+        if variant is not None:
+            ids = self.by_title.get((title, variant), [])
+        else:
+            ids = self.by_title_only.get(title, [])
+        return [self.by_job[j] for j in ids]
+
+    # ----- ljud -----
+
+    def commit_audio(self, tmp_path, final_path, sha256):
+        """
+        Flytta färdig nedladdning (tmp_path) till final_path. Finns samma ljud redan
+        hårdlänkas det i stället. Returnerar sökvägen till filen som länkades (eller None).
+        """
+        with self._locked():
+            existing = self.by_hash.get(sha256) if self.dedup else None
+            if existing and not os.path.isfile(existing):
+                existing = None
+                # Filen i indexet är borttagen -> den nya filen blir originalet för kommande dubbletter
+                self.by_hash[sha256] = final_path
+            if existing and os.path.abspath(existing) != os.path.abspath(final_path):
+                try:
+                    if os.path.exists(final_path):
+                        os.remove(final_path)
+                    os.link(existing, final_path)
+                    os.remove(tmp_path)
+                    return existing
+                except OSError:
+                    pass    # hårdlänk stöds inte här -> spara som vanlig fil
+            os.replace(tmp_path, final_path)
+            if self.dedup:
+                self.by_hash.setdefault(sha256, final_path)
+            return None
+
+# ---------- CLI ----------
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] != "find":
+        print("Användning: python storage.py find <job_id | titel> [variant]")
+        sys.exit(1)
+    st = Storage()
+    key = sys.argv[2]
+    variant = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    rec = st.lookup(key)
+    recs = [rec] if rec else st.find(key, variant)
+    if not recs:
+        print(f"Hittade inget för '{key}' i {st.manifest_path}")
+        sys.exit(1)
+    for r in recs:
+        print(f"{r['job_id']}  {r['title']} v{r['variant']}  {r['path']}  (json: {r.get('json_path')})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+suno_daemon.py — Resident tjänst som bevakar en inkorg efter promptfiler och kör create + poll.
+
+Lägg en promptfil (samma format som sunoprompt_aktiv.json) i inkorgen (DAEMON_INBOX).
+Daemonen flyttar den till en egen batchkatalog och kör create_songs.run_create() och
+poll_songs.run_poll() i arbetartrådar med varma HTTP-anslutningar (en requests.Session
+per tråd). Create för nästa batch körs medan tidigare batcher pollas.
+
+  python suno_daemon.py
+
+Status för alla batcher:  <DAEMON_DIR>/daemon_status.json
+Stoppa:  Ctrl+C / SIGTERM, eller skapa filen <DAEMON_DIR>/STOP.
+Pågående arbete checkpointas i batchens status.json och återupptas vid nästa start.
+"""
+
+import os, sys, json, time, datetime, signal, queue, threading
+
+import apirecorder
+import create_songs
+import poll_songs
+import runs
+
+# ---------- Konfiguration ----------
+# .env har redan lästs in av create_songs/poll_songs vid import
+
+INBOX_DIR    = os.getenv("DAEMON_INBOX", "inbox")
+DAEMON_DIR   = os.getenv("DAEMON_DIR", "daemon")
+SCAN_SEC     = float(os.getenv("DAEMON_SCAN_SEC", "5"))
+SETTLE_SEC   = float(os.getenv("DAEMON_SETTLE_SEC", "2"))   # promptfilen ska ha legat orörd så länge
+POLL_WORKERS = int(os.getenv("DAEMON_POLL_WORKERS", "2"))
+
+BATCH_DIR   = os.path.join(DAEMON_DIR, "batches")
+STATUS_FILE = os.path.join(DAEMON_DIR, "daemon_status.json")
+STOP_FILE   = os.path.join(DAEMON_DIR, "STOP")
+LOG_FILE    = os.path.join(DAEMON_DIR, "log.txt")
+
+STOP = threading.Event()
+
+# Batchens statusfil (meta.overall_status) -> vilket steg som ska köras vid (om)start
+RESUME_CREATE = ("CREATING", "CREATE_INTERRUPTED")
+RESUME_POLL   = ("READY_TO_POLL", "POLLING", "POLL_INTERRUPTED")
+
+# ---------- Logg ----------
+
+def _ts():
+    return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def log(msg):
+    s = f"{_ts()} - [daemon] {msg}"
+    print(s)
+    try:
+        with open(LOG_FILE, "a", encoding="utf-8") as lf:
+            lf.write(s + "\n")
+    except Exception as e:
+        print(f"⚠️  Kunde inte skriva till logg: {e}")
+
+# ---------- Batchregister ----------
+
+_batches = {}
+_batches_lock = threading.Lock()
+_status_write_lock = threading.Lock()
+_started_at = _ts()
+
+def batch_paths(batch_id):
+    """Varje batch är en körning (runs.py) med daemonens batchkatalog som bas."""
+    return runs.run_paths(batch_id, BATCH_DIR)
+
+def read_batch_status(batch_id):
+    """meta + antal items per status ur batchens status.json (None om den saknas/är halvskriven)."""
+    try:
+        with open(batch_paths(batch_id)["status"], "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None, None
+    counts = {}
+    for itm in data.get("items", []):
+        st = itm.get("status")
+        counts[st] = counts.get(st, 0) + 1
+    return data.get("meta", {}), counts
+
+def write_daemon_status(state="RUNNING"):
+    with _batches_lock:
+        doc = {
+            "meta": {
+                "state": state,
+                "started_at": _started_at,
+                "updated_at": _ts(),
+                "inbox": os.path.abspath(INBOX_DIR),
+                "poll_workers": POLL_WORKERS,
+            },
+            "batches": {bid: dict(b) for bid, b in _batches.items()},
+        }
+    tmp = STATUS_FILE + ".tmp"
+    try:
+        with _status_write_lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(doc, f, indent=2)
+            os.replace(tmp, STATUS_FILE)
+    except Exception as e:
+        log(f"⚠️  Kunde inte skriva {STATUS_FILE}: {e}")
+
+def set_stage(batch_id, stage, refresh=True, **extra):
+    meta, counts = read_batch_status(batch_id) if refresh else (None, None)
+    with _batches_lock:
+        b = _batches.setdefault(batch_id, {"dir": batch_paths(batch_id)["dir"]})
+        b["stage"] = stage
+        b["updated_at"] = _ts()
+        if meta is not None:
+            b["overall_status"] = meta.get("overall_status")
+            b["counts"] = counts
+        b.update(extra)
+    write_daemon_status()
+
+def refresh_active():
+    """Uppdatera räknare för batcher som håller på (läses från deras statusfiler)."""
+    with _batches_lock:
+        active = [bid for bid, b in _batches.items() if b.get("stage") in ("CREATING", "POLLING")]
+    for bid in active:
+        meta, counts = read_batch_status(bid)
+        if meta is None:
+            continue
+        with _batches_lock:
+            _batches[bid]["overall_status"] = meta.get("overall_status")
+            _batches[bid]["counts"] = counts
+    write_daemon_status()
+
+# ---------- Arbetare ----------
+
+def create_worker(create_q, poll_q):
+    session = apirecorder.make_session()
+    while True:
+        batch_id = create_q.get()
+        if batch_id is None:
+            break
+        if STOP.is_set():
+            continue    # ligger kvar på disk och tas upp vid nästa start
+        p = batch_paths(batch_id)
+        create_songs.set_log_file(p["log"])
+        create_songs.init_log(reset=False)
+        set_stage(batch_id, "CREATING", refresh=False)
+        log(f"▶ create {batch_id}")
+        try:
+            rc = create_songs.run_create(p["prompt"], p["status"], archive_dir=p["dir"],
+                                         session=session, resume=True, batch_id=batch_id)
+        except Exception as e:
+            log(f"✗ create {batch_id} kraschade: {e}")
+            set_stage(batch_id, "FAILED", error=str(e))
+            continue
+        meta, _ = read_batch_status(batch_id)
+        if rc == 2:
+            set_stage(batch_id, "INTERRUPTED")
+        elif rc == 0 and meta and meta.get("overall_status") == "READY_TO_POLL":
+            set_stage(batch_id, "QUEUED_POLL")
+            poll_q.put(batch_id)
+        else:
+            set_stage(batch_id, "FAILED")
+            log(f"✗ create {batch_id} gav inga jobb att polla")
+
+def poll_worker(poll_q):
+    session = apirecorder.make_session()
+    while True:
+        batch_id = poll_q.get()
+        if batch_id is None:
+            break
+        if STOP.is_set():
+            continue
+        p = batch_paths(batch_id)
+        poll_songs.set_log_file(p["log"])
+        poll_songs.init_log()
+        set_stage(batch_id, "POLLING", refresh=False)
+        log(f"▶ poll {batch_id}")
+        try:
+            # archive=False: status.json ligger kvar i batchkatalogen som resultat
+            rc = poll_songs.run_poll(p["status"], prompt_file=None, archive=False, session=session)
+        except Exception as e:
+            log(f"✗ poll {batch_id} kraschade: {e}")
+            set_stage(batch_id, "FAILED", error=str(e))
+            continue
+        if rc == 2:
+            set_stage(batch_id, "INTERRUPTED")
+        elif rc == 0:
+            set_stage(batch_id, "DONE")
+            log(f"✓ batch {batch_id} klar")
+        else:
+            set_stage(batch_id, "FAILED")
+
+# ---------- Inkorg ----------
+
+def _safe(name):
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+
+def claim_inbox(create_q):
+    """Flytta färdigskrivna promptfiler från inkorgen till egna batchkataloger."""
+    try:
+        names = sorted(os.listdir(INBOX_DIR))
+    except FileNotFoundError:
+        return
+    now = time.time()
+    for name in names:
+        src = os.path.join(INBOX_DIR, name)
+        if not name.lower().endswith(".json") or not os.path.isfile(src):
+            continue
+        try:
+            if now - os.path.getmtime(src) < SETTLE_SEC:
+                continue    # skrivs kanske fortfarande
+        except OSError:
+            continue
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        base = f"{stamp}_{_safe(os.path.splitext(name)[0])}"
+        batch_id, n = base, 1
+        while os.path.exists(batch_paths(batch_id)["dir"]):
+            n += 1
+            batch_id = f"{base}_{n}"
+        p = batch_paths(batch_id)
+        try:
+            os.makedirs(p["dir"])
+            os.replace(src, p["prompt"])
+        except Exception as e:
+            log(f"⚠️  Kunde inte ta in {src}: {e}")
+            continue
+        log(f"• Ny batch {batch_id} ← {name}")
+        set_stage(batch_id, "QUEUED_CREATE", refresh=False, source=name)
+        create_q.put(batch_id)
+
+def recover_batches(create_q, poll_q):
+    """Återuppta batcher som inte blev klara förra gången (checkpoint i status.json)."""
+    if not os.path.isdir(BATCH_DIR):
+        return
+    for batch_id in sorted(os.listdir(BATCH_DIR)):
+        p = batch_paths(batch_id)
+        if not os.path.isfile(p["prompt"]):
+            continue
+        meta, _ = read_batch_status(batch_id)
+        overall = meta.get("overall_status") if meta else None
+        if meta is None or overall in RESUME_CREATE:
+            set_stage(batch_id, "QUEUED_CREATE")
+            create_q.put(batch_id)
+            log(f"↻ Återupptar create för {batch_id}")
+        elif overall in RESUME_POLL:
+            set_stage(batch_id, "QUEUED_POLL")
+            poll_q.put(batch_id)
+            log(f"↻ Återupptar poll för {batch_id}")
+        elif overall == "DONE":
+            set_stage(batch_id, "DONE")
+        else:
+            set_stage(batch_id, "FAILED")
+
+# ---------- Körning ----------
+
+def request_stop(*_args):
+    if not STOP.is_set():
+        log("⏹ Stoppsignal mottagen – checkpointar pågående arbete...")
+    STOP.set()
+    create_songs.STOP.set()
+    poll_songs.STOP.set()
+
+def main():
+    for d in (INBOX_DIR, DAEMON_DIR, BATCH_DIR):
+        os.makedirs(d, exist_ok=True)
+    create_songs.ensure_directories()
+    # Loggar från modulerna i huvudtråden hamnar i daemonens logg
+    create_songs.set_log_file(LOG_FILE)
+    poll_songs.set_log_file(LOG_FILE)
+
+    if not create_songs.load_api_key():
+        log("🚫 SUNO_API_KEY saknas. Lägg den i .env (SUNO_API_KEY=...)")
+        sys.exit(1)
+
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, request_stop)
+    if hasattr(signal, "SIGBREAK"):
+        signal.signal(signal.SIGBREAK, request_stop)   # Windows: Ctrl+Break
+
+    log(f"=== suno_daemon.py start – inkorg: {os.path.abspath(INBOX_DIR)} ===")
+
+    create_q, poll_q = queue.Queue(), queue.Queue()
+    workers = [threading.Thread(target=create_worker, args=(create_q, poll_q), name="create")]
+    workers += [threading.Thread(target=poll_worker, args=(poll_q,), name=f"poll-{i + 1}")
+                for i in range(max(1, POLL_WORKERS))]
+    for t in workers:
+        t.start()
+
+    recover_batches(create_q, poll_q)
+
+    while not STOP.is_set():
+        if os.path.exists(STOP_FILE):
+            try:
+                os.remove(STOP_FILE)
+            except OSError:
+                pass
+            request_stop()
+            break
+        claim_inbox(create_q)
+        refresh_active()
+        STOP.wait(SCAN_SEC)
+
+    # Nedstängning: arbetarna avbryter vid nästa kontrollpunkt och lämnar checkpoint
+    write_daemon_status("STOPPING")
+    create_q.put(None)
+    workers[0].join()
+    for _ in workers[1:]:
+        poll_q.put(None)
+    for t in workers[1:]:
+        t.join()
+
+    if create_songs.TRACER.enabled:
+        create_songs.save_trace()
+    if poll_songs.TRACER.enabled:
+        poll_songs.save_trace()
+
+    write_daemon_status("STOPPED")
+    log("=== suno_daemon.py stoppad ===")
+
+if __name__ == "__main__":
+    main()
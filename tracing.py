@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tracing.py — Enkel span-tracing för create/poll, exporteras som Chrome trace JSON.
+
+Filen kan öppnas i https://ui.perfetto.dev eller chrome://tracing.
+Varje jobb (item) får ett eget spår ("lane"); spans inom spåret nästlas:
+  item > http-request / backoff-sleep / status_write / download ...
+
+Avstängd tracer kostar nästan inget: span() returnerar ett tomt kontextobjekt.
+Tidsstämplar är epoch-baserade (µs) så att trace från create och poll kan läggas ihop.
+"""
+
+import os, json, time, threading
+
+# Spår-id per batch: batch n får id n * LANE_BLOCK + position (se lane_block)
+LANE_BLOCK = 1_000_000
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "tid", "args", "start")
+
+    def __init__(self, tracer, name, cat, tid, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.tid = tid
+        self.args = args
+
+    def __enter__(self):
+        self.start = self.tracer.now_us()
+        return self.args
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._add({
+            "name": self.name, "cat": self.cat, "ph": "X",
+            "ts": self.start, "dur": self.tracer.now_us() - self.start,
+            "pid": self.tracer.pid, "tid": self.tid, "args": self.args,
+        })
+        return False
+
+class Tracer:
+    """
+    Samlar trace-händelser i minnet och skriver dem med save().
+    Aktuellt spår (lane) är per tråd, så status_write m.m. hamnar under rätt item.
+    """
+
+    def __init__(self, process_name, enabled=False):
+        self.enabled = enabled
+        self.pid = os.getpid()
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._epoch_us = time.time() * 1e6
+        self._blocks = 0
+        self._perf0 = time.perf_counter()
+        if enabled:
+            self._add({"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+                       "args": {"name": process_name}})
+
+    def now_us(self):
+        return self._epoch_us + (time.perf_counter() - self._perf0) * 1e6
+
+    def _add(self, ev):
+        with self._lock:
+            self.events.append(ev)
+
+    # ----- spår -----
+
+    def set_lane(self, tid, name=None):
+        """Byt aktuellt spår för denna tråd; name sätts som spårets etikett."""
+        self._local.tid = tid
+        if self.enabled and name:
+            self._add({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                       "args": {"name": name}})
+
+    def lane(self):
+        return getattr(self._local, "tid", 0)
+
+    def lane_block(self):
+        """
+        Bas för spår-id för en ny batch (0, LANE_BLOCK, 2*LANE_BLOCK, ...). Daemonen pollar
+        flera batcher samtidigt mot samma tracer; utan egen bas skulle de dela spår.
+        """
+        with self._lock:
+            base = self._blocks * LANE_BLOCK
+            self._blocks += 1
+        return base
+
+    # ----- spans -----
+
+    def span(self, name, cat="", tid=None, **args):
+        """
+        with tracer.span("POST generate", cat="http") as sp:
+            ...
+            sp["http_status"] = 200
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, self.lane() if tid is None else tid, args)
+
+    def begin(self, name, cat="", **args):
+        """Öppna en span på aktuellt spår (för block som inte passar i with)."""
+        if self.enabled:
+            self._add({"name": name, "cat": cat, "ph": "B", "ts": self.now_us(),
+                       "pid": self.pid, "tid": self.lane(), "args": args})
+
+    def end(self, **args):
+        """Stäng senaste begin() på aktuellt spår."""
+        if self.enabled:
+            self._add({"ph": "E", "ts": self.now_us(), "pid": self.pid,
+                       "tid": self.lane(), "args": args})
+
+    # ----- export -----
+
+    def save(self, path):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path